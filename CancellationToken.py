@@ -0,0 +1,41 @@
+import threading
+
+
+class CancellationToken:
+    """
+    Token to cancel running and future checks from another thread. The ETRSolver registers the z3 context of its
+    solver while a check is running, and cancelling the token interrupts all registered contexts. A solver with a
+    token has a z3 context of its own, so the checks of other solvers are not interrupted. Checks that start after
+    the token is cancelled return unknown without calling z3.
+    The token only works within a single process.
+    """
+    def __init__(self):
+        self.event = threading.Event()
+        self.lock = threading.Lock()
+        self.contexts = list()
+
+    def cancel(self):
+        with self.lock:
+            self.event.set()
+            for ctx in self.contexts:
+                ctx.interrupt()
+
+    @property
+    def cancelled(self):
+        return self.event.is_set()
+
+    """
+    Register a z3 context, such that it is interrupted when the token is cancelled.
+    :returns: False if the token is already cancelled, in which case the context is not registered
+    """
+    def register(self, ctx):
+        with self.lock:
+            if self.event.is_set():
+                return False
+            self.contexts.append(ctx)
+            return True
+
+    def unregister(self, ctx):
+        with self.lock:
+            if ctx in self.contexts:
+                self.contexts.remove(ctx)
@@ -0,0 +1,288 @@
+from fractions import Fraction
+from ReachableRegion import is_trivial, to_fraction
+from z3 import sat, unsat
+import numpy as np
+
+
+class DenseBackend:
+    """
+    Backend for the ETRSolver, for linear path schemes where all updates are constant.
+    The updates of the path and the cycles are stored as dense matrices, and reachability is decided as a linear
+    feasibility problem with an exact rational simplex:
+        the coefficients of the path are in (0, 1],
+        the coefficients of a trivial cycle (all updates are collinear) are >= 0,
+        the coefficients of any other cycle are either all > 0, or the cycle is not taken,
+        the sum of all updates times their coefficients equals the target.
+    Updates with the same direction are interchangeable: if the coefficient of one of them can be positive, the
+    coefficients of all of them can. So the linear program has a single column for each direction of the path,
+    and for each direction of the cycles. Updates (0, 0) do not change the sum, and are left out.
+    The strict inequalities are handled by finding the columns that are zero in every solution. The target is
+    reachable if no column of the path is always zero, after removing all cycles with a column that is always zero.
+    The average of the solutions found on the way has all other columns positive.
+    :param path: the path of the linear path scheme
+    :param cycles: the dictionary of cycles of the linear path scheme
+    """
+    def __init__(self, path, cycles):
+        self.path_matrix = updates_matrix(path)
+        self.cycle_matrices = [updates_matrix(cycle) for cycle in cycles.values()]
+        self.trivial = [is_trivial(matrix.T) for matrix in self.cycle_matrices]
+        # For each direction in the path, the sum of the updates and the indices of the transitions
+        self.path_directions = dict()
+        for i, key in enumerate(directions(self.path_matrix)):
+            if key is not None:
+                total, indices = self.path_directions.get(key, (np.zeros(2, dtype=int), []))
+                self.path_directions[key] = (total + self.path_matrix[:, i], indices + [i])
+        self.cycle_directions = [directions(matrix) for matrix in self.cycle_matrices]
+
+    """
+    :returns: the result of the check, and the values for the model if the target is reachable: a list of the
+    coefficients of all transitions, in the order of the path followed by the cycles, and the sum of each cycle
+    """
+    def check(self, target_x, target_y):
+        target = np.array([to_fraction(target_x), to_fraction(target_y)], dtype=object)
+        active = [j for j, trivial in enumerate(self.trivial) if not trivial]
+        while True:
+            columns, vectors, upper, strict = self.columns(active)
+            result = relative_interior(vectors, target, upper, strict)
+            if result is None:
+                return unsat, None
+            forced, point = result
+            if any(columns[v][0] == "path" for v in forced):
+                return unsat, None
+            forced = {columns[v][1] for v in forced}
+            inactive = {j for j in active if forced & set(self.cycle_directions[j])}
+            if not inactive:
+                return sat, self.values(active, columns, point)
+            active = [j for j in active if j not in inactive]
+
+    """
+    :param active: the indices of the non-trivial cycles that are taken
+    :returns: the columns of the linear program as (kind, direction), their vectors, upper bounds and the
+    indices of the columns that have to be positive
+    """
+    def columns(self, active):
+        columns = [("path", key) for key in self.path_directions]
+        upper = [Fraction(1)] * len(columns)
+        strict = list(range(len(columns)))
+        cycle_columns = dict()
+        for j, trivial in enumerate(self.trivial):
+            if trivial or j in active:
+                for key in self.cycle_directions[j]:
+                    if key is not None:
+                        cycle_columns[key] = cycle_columns.get(key, False) or not trivial
+        for key, positive in cycle_columns.items():
+            if positive:
+                strict.append(len(columns))
+            columns.append(("cycle", key))
+            upper.append(None)
+        vectors = np.empty((2, len(columns)), dtype=object)
+        for v, (kind, key) in enumerate(columns):
+            vectors[:, v] = self.path_directions[key][0] if kind == "path" else key
+        return columns, vectors, upper, strict
+
+    """
+    Divide the value of each column over the transitions with that direction. The coefficients of cycles that
+    are not taken, and of updates (0, 0) are set to 1, while the sum of cycles that are not taken is (0, 0).
+    """
+    def values(self, active, columns, point):
+        path = [Fraction(1)] * self.path_matrix.shape[1]
+        cycles = [[Fraction(1)] * matrix.shape[1] for matrix in self.cycle_matrices]
+        taken = [j for j in range(len(self.trivial)) if self.trivial[j] or j in active]
+        users = dict()
+        for j in taken:
+            for i, key in enumerate(self.cycle_directions[j]):
+                if key is not None:
+                    users.setdefault(key, []).append((j, i))
+        for (kind, key), value in zip(columns, point):
+            if kind == "path":
+                for i in self.path_directions[key][1]:
+                    path[i] = value
+            else:
+                for j, i in users[key]:
+                    # The update is a positive multiple of the direction
+                    scale = max(abs(self.cycle_matrices[j][0, i]), abs(self.cycle_matrices[j][1, i]))
+                    cycles[j][i] = value / (len(users[key]) * scale)
+        sums = list()
+        for j, matrix in enumerate(self.cycle_matrices):
+            if j in taken:
+                sums.append(tuple(matrix.dot(np.array(cycles[j], dtype=object))))
+            else:
+                sums.append((Fraction(0), Fraction(0)))
+        return path + [value for cycle in cycles for value in cycle], sums
+
+
+"""
+:param transitions: a list of transitions with constant updates
+:returns: a 2 x len(transitions) object array with the updates as Fractions
+"""
+def updates_matrix(transitions):
+    matrix = np.empty((2, len(transitions)), dtype=object)
+    for i, item in enumerate(transitions):
+        matrix[0, i] = to_fraction(item[1])
+        matrix[1, i] = to_fraction(item[2])
+    return matrix
+
+
+"""
+:returns: for each update in the matrix its direction, as the update divided by its largest absolute value,
+or None if the update is (0, 0)
+"""
+def directions(matrix):
+    result = list()
+    for x, y in matrix.T:
+        scale = max(abs(x), abs(y))
+        result.append(None if scale == 0 else (x / scale, y / scale))
+    return result
+
+
+"""
+Find the variables in the given list that are zero in every solution of A x = b, 0 <= x <= upper.
+Variables that can be positive are found by repeatedly maximizing the sum of the remaining variables, starting
+each time from the basis of the previous round.
+:param strict: the indices of the variables to check
+:returns: None if there is no solution. Otherwise, the set of variables that are always zero, and a solution
+where all other variables of the list are positive.
+"""
+def relative_interior(A, b, upper, strict):
+    simplex = Simplex(A, b, upper)
+    if not simplex.feasible():
+        return None
+    n = A.shape[1]
+    undetermined = set(strict)
+    total = [Fraction(0)] * n
+    rounds = 0
+    while True:
+        status, x, ray = simplex.maximize([1 if v in undetermined else 0 for v in range(n)])
+        if status == "unbounded":
+            x = [value + step for value, step in zip(x, ray)]
+        total = [value + step for value, step in zip(total, x)]
+        rounds += 1
+        positive = {v for v in undetermined if x[v] > 0}
+        undetermined -= positive
+        if not positive or not undetermined:
+            return undetermined, [value / rounds for value in total]
+
+
+class Simplex:
+    """
+    Exact primal simplex with bounded variables for A x = b and 0 <= x <= upper. The first phase finds a feasible
+    basis using an artificial variable for each row, after which any number of objectives can be maximized.
+    Non-basic variables are at their lower bound 0, or at their upper bound if they are in at_upper.
+    The entering variable has the largest reduced cost, except after a degenerate pivot, where Bland's rule is
+    used to avoid cycling. The linear programs are small, so the columns are kept as lists of Fractions.
+    :param upper: the upper bound for each variable, None if the variable is unbounded
+    """
+    def __init__(self, A, b, upper):
+        rows, self.n = A.shape
+        sign = [1 if value >= 0 else -1 for value in b]
+        self.columns = [[Fraction(A[r, j]) * sign[r] for r in range(rows)] for j in range(self.n)]
+        self.columns += [[Fraction(int(r == j)) for r in range(rows)] for j in range(rows)]
+        self.b = [Fraction(b[r]) * sign[r] for r in range(rows)]
+        self.upper = list(upper) + [None] * rows
+        self.basis = list(range(self.n, self.n + rows))
+        self.at_upper = set()
+
+    """
+    Minimize the sum of the artificial variables, and fix them to 0 afterwards.
+    :returns: whether there is a solution
+    """
+    def feasible(self):
+        rows = len(self.basis)
+        status, x, ray = self.optimize([0] * self.n + [-1] * rows)
+        if any(x[self.n:]):
+            return False
+        self.upper[self.n:] = [Fraction(0)] * rows
+        return True
+
+    """
+    Maximize c x, starting from the current basis. Should only be called after self.feasible().
+    :returns: the status ("optimal" or "unbounded"), a basic solution, and an unbounded ray if the status is
+    unbounded
+    """
+    def maximize(self, c):
+        status, x, ray = self.optimize(list(c) + [0] * len(self.basis))
+        return status, x[:self.n], None if ray is None else ray[:self.n]
+
+    def optimize(self, c):
+        columns, upper, basis, at_upper = self.columns, self.upper, self.basis, self.at_upper
+        rows = len(basis)
+        n = len(columns)
+        degenerate = False
+        while True:
+            B_inv = inverse([[columns[j][r] for j in basis] for r in range(rows)])
+            residual = list(self.b)
+            for j in at_upper:
+                for r in range(rows):
+                    residual[r] -= columns[j][r] * upper[j]
+            x = [Fraction(0)] * n
+            for j in at_upper:
+                x[j] = upper[j]
+            for i, j in enumerate(basis):
+                x[j] = sum(B_inv[i][r] * residual[r] for r in range(rows))
+            duals = [sum(c[j] * B_inv[i][r] for i, j in enumerate(basis)) for r in range(rows)]
+
+            entering = None
+            best = 0
+            for j in range(n):
+                if j in basis:
+                    continue
+                reduced = c[j] - sum(duals[r] * columns[j][r] for r in range(rows))
+                if j in at_upper and reduced < 0 or \
+                        j not in at_upper and reduced > 0 and (upper[j] is None or upper[j] > 0):
+                    if abs(reduced) > best:
+                        entering = j
+                        best = abs(reduced)
+                    if degenerate:
+                        break
+            if entering is None:
+                return "optimal", x, None
+
+            direction = -1 if entering in at_upper else 1
+            alpha = [sum(B_inv[i][r] * columns[entering][r] for r in range(rows)) for i in range(rows)]
+            theta = upper[entering]
+            leaving = None
+            for i, k in enumerate(basis):
+                rate = -direction * alpha[i]
+                if rate < 0:
+                    limit = x[k] / -rate
+                elif rate > 0 and upper[k] is not None:
+                    limit = (upper[k] - x[k]) / rate
+                else:
+                    continue
+                if theta is None or limit < theta or limit == theta and leaving is not None and k < basis[leaving]:
+                    theta = limit
+                    leaving = i
+            if theta is None:
+                ray = [Fraction(0)] * n
+                ray[entering] = Fraction(direction)
+                for i, k in enumerate(basis):
+                    ray[k] = -direction * alpha[i]
+                return "unbounded", x, ray
+            degenerate = theta == 0
+            if leaving is None:
+                at_upper.symmetric_difference_update({entering})
+                continue
+            k = basis[leaving]
+            if -direction * alpha[leaving] > 0:
+                at_upper.add(k)
+            at_upper.discard(entering)
+            basis[leaving] = entering
+
+
+"""
+:returns: the inverse of a square matrix of Fractions, given as list of rows, using Gauss-Jordan elimination
+"""
+def inverse(matrix):
+    size = len(matrix)
+    augmented = [list(row) + [Fraction(int(r == c)) for c in range(size)] for r, row in enumerate(matrix)]
+    for col in range(size):
+        pivot = next(row for row in range(col, size) if augmented[row][col] != 0)
+        augmented[col], augmented[pivot] = augmented[pivot], augmented[col]
+        factor = augmented[col][col]
+        augmented[col] = [value / factor for value in augmented[col]]
+        for row in range(size):
+            if row != col and augmented[row][col] != 0:
+                factor = augmented[row][col]
+                augmented[row] = [value - factor * pivot_value
+                                  for value, pivot_value in zip(augmented[row], augmented[col])]
+    return [row[size:] for row in augmented]
@@ -1,10 +1,88 @@
 from z3 import *
+from collections import deque
+from contextlib import nullcontext
+from DenseBackend import DenseBackend
+from enum import Enum
+from LinearPathScheme import LinearPathScheme
+from Metrics import Measured
+from Prefilter import Prefilter
+from ReachableRegion import ReachableRegion, is_trivial, to_fraction
+import itertools
 import json
+import numpy as np
 
 
-class ETRSolver:
-    def __init__(self, data):
-        self.solver = Solver()
+class Result(Enum):
+    """
+    The result of a reachability query. Only SAT is truthy, so an unknown result is never mistaken for a
+    reachable target.
+    """
+    SAT = "sat"
+    UNSAT = "unsat"
+    UNKNOWN = "unknown"
+
+    def __bool__(self):
+        return self is Result.SAT
+
+    """
+    :param result: the result of a z3 check
+    """
+    @staticmethod
+    def of(result):
+        if result == sat:
+            return Result.SAT
+        if result == unsat:
+            return Result.UNSAT
+        return Result.UNKNOWN
+
+
+class ETRSolver(Measured):
+    # Number of satisfying models kept to answer nearby targets in verify_many without calling the solver
+    MAX_WITNESSES = 32
+
+    """
+    :param data: the linear path scheme, as json with a path and a dictionary of cycles, or as LinearPathScheme
+    :param incremental: whether the target independent constraints are only asserted once
+    :param cache: an optional ResultCache
+    :param backend: "z3" to solve every query with z3, or "dense" to use the DenseBackend. If the linear path
+    scheme has symbolic updates, or transitions sharing their variables, the dense backend falls back to z3.
+    Any other object is used as backend, if it provides check(target_x, target_y), returning the result and the
+    values for the model like DenseBackend.check().
+    :param metrics: an optional Metrics object, to record the time of the encoding and the checks, the z3
+    statistics, and the number of queries answered by the cache or by earlier models
+    :param timeout: the maximum time of each z3 check in milliseconds, None for no limit
+    :param rlimit: the maximum number of z3 resource units of each check, None for no limit. Unlike the timeout,
+    this limit is deterministic.
+    :param token: an optional CancellationToken, to interrupt the checks from another thread. The solver then
+    uses its own z3 context, self.ctx, instead of the main context.
+    :param prefilter: whether targets are first checked against the necessary conditions of the Prefilter. Only
+    used if all updates are constant.
+    """
+    def __init__(self, data, incremental=False, cache=None, backend="z3", metrics=None, timeout=None, rlimit=None,
+                 token=None, prefilter=True):
+        # Cancelling a token interrupts the whole z3 context, so a solver with a token has a context of its own
+        self.ctx = None if token is None else Context()
+        self.solver = Solver(ctx=self.ctx)
+        self.incremental = incremental
+        self.cache = cache
+        self.metrics = metrics
+        self.token = token
+        if timeout is not None:
+            self.solver.set("timeout", int(timeout))
+        if rlimit is not None:
+            self.solver.set("rlimit", int(rlimit))
+        self.reason_unknown = None
+        self.encoded = False
+        self.total_x = None
+        self.total_y = None
+        self.last_target = None
+        self.last_result = None
+        self.last_model = None
+        self.backend_values = None
+        self.witnesses = deque(maxlen=self.MAX_WITNESSES)
+        if isinstance(data, LinearPathScheme):
+            # The labels of the states are the names of the z3 variables
+            data = data.to_json()
         self.path = data.get("path", [])
         self.cycles = data.get("cycles", {})
         self.transitions = []
@@ -13,6 +91,17 @@ class ETRSolver:
         for cycle in self.get_cycles().values():
             for item in cycle:
                 self.transitions.append(item)
+        # Cycles can only be scaled independently if no two transitions share their variables
+        labels = [(item[0], item[3]) for item in self.get_transitions()]
+        self.independent_transitions = len(set(labels)) == len(labels)
+        if backend == "z3":
+            self.backend = None
+        elif backend == "dense":
+            dense = self.is_linear() and self.independent_transitions
+            self.backend = DenseBackend(self.get_path(), self.get_cycles()) if dense else None
+        else:
+            self.backend = backend
+        self.prefilter = Prefilter(self.get_path(), self.get_cycles()) if prefilter and self.is_linear() else None
 
     def get_path(self):
         return self.path
@@ -26,70 +115,413 @@ class ETRSolver:
     def get_transitions(self):
         return self.transitions
 
-    def verify(self, target_x, target_y):
-        self.solve(target_x, target_y)
-        return self.solver.check() == sat
+    """
+    :returns: whether the target is reachable as Result, which is unknown if the check timed out, ran out of
+    resources or was cancelled. If no target is given, the result of the last query is returned.
+    """
+    def verify(self, target_x=None, target_y=None):
+        return Result.of(self.check(target_x, target_y))
 
-    def model(self, target_x, target_y):
-        self.solve(target_x, target_y)
-        if self.solver.check() == sat:
-            return self.solver.model()
+    """
+    :returns: a model for the target if it is reachable, the result of the check otherwise.
+    If no target is given, the model of the last query is returned.
+    """
+    def model(self, target_x=None, target_y=None):
+        result = self.check(target_x, target_y)
+        if result == sat:
+            return self.get_model()
         else:
-            return self.solver.check()
+            return result
 
+    """
+    Returns the result of the check for the given target. The result of the last query is cached, so asking
+    again for the same target does not call the solver a second time.
+    :exception: If no target is given, and no query was done before
+    """
+    def check(self, target_x=None, target_y=None):
+        if target_x is None and target_y is None:
+            if self.last_target is None:
+                raise ValueError("No target given, and no target was solved before.")
+        elif self.last_target != (target_x, target_y):
+            self.solve(target_x, target_y)
+        return self.last_result
+
+    """
+    Solve the reachability query for the given target. In incremental mode, the path, cycle and negation
+    constraints are only asserted once, and the target is checked within a push/pop scope.
+    Otherwise the solver is reset, and all constraints are asserted again.
+    If a cache is given, the result is looked up in the cache first, and stored in the cache afterwards.
+    If a backend is used, the query is solved by the backend instead.
+    Targets rejected by the prefilter are unsat without calling the cache or the solver.
+    :returns: the result of the check
+    """
     def solve(self, target_x, target_y):
-        self.solver.reset()
-        path_x, path_y = Reals("path_x path_y")
-        cycles_x = [Real(f'cycle_x_{name}') for name in self.get_cycles()]
-        cycles_y = [Real(f'cycle_y_{name}') for name in self.get_cycles()]
-        self.solve_path(path_x, path_y)
+        if self.prefilter is not None:
+            kind = self.prefilter.classify([(target_x, target_y)])[0]
+            if kind != Prefilter.PASSED:
+                self.store_rejected(target_x, target_y, kind)
+                return self.last_result
+        if self.load_cached(target_x, target_y):
+            return self.last_result
+        if self.backend is not None:
+            self.solve_backend(target_x, target_y)
+        elif self.incremental:
+            self.solve_scoped(target_x, target_y)
+        else:
+            self.solver.reset()
+            self.encode()
+            self.add_target(target_x, target_y)
+            self.store_check(target_x, target_y)
+            self.encoded = False
+        self.store_cached()
+        return self.last_result
+
+    """
+    Check the target within a push/pop scope on top of the target independent constraints.
+    """
+    def solve_scoped(self, target_x, target_y):
+        if not self.encoded:
+            self.solver.reset()
+            self.encode()
+        self.solver.push()
+        self.add_target(target_x, target_y)
+        self.store_check(target_x, target_y)
+        self.solver.pop()
+
+    """
+    Solve the query with the backend. The z3 model is only constructed from the values of the backend when
+    it is asked for, see self.get_model().
+    """
+    def solve_backend(self, target_x, target_y):
+        if self.token is not None and self.token.cancelled:
+            result, values = unknown, None
+            self.reason_unknown = "canceled"
+        else:
+            with self.timer("backend"):
+                result, values = self.backend.check(target_x, target_y)
+            self.reason_unknown = None
+        self.last_target = (target_x, target_y)
+        self.last_result = result
+        self.last_model = None
+        self.backend_values = values
+
+    """
+    Store unsat as result for a target rejected by the prefilter.
+    :param kind: the check of the prefilter that rejected the target
+    """
+    def store_rejected(self, target_x, target_y, kind):
+        self.last_target = (target_x, target_y)
+        self.last_result = unsat
+        self.last_model = None
+        self.backend_values = None
+        self.reason_unknown = None
+        self.count("prefilter_box" if kind == Prefilter.BOX else "prefilter_cone")
+
+    """
+    :returns: the model of the last query, or None if there is none
+    """
+    def get_model(self):
+        if self.last_model is None and self.backend_values is not None:
+            alphas, sums = self.backend_values
+            self.last_model = Model(self.ctx)
+            for item, value in zip(self.get_transitions(), alphas):
+                self.last_model.update_value(Real(f'a_{item[0]}--{item[3]}', self.ctx), RealVal(value, self.ctx))
+            path_x, path_y = self.path_sum(alphas)
+            self.last_model.update_value(Real("path_x", self.ctx), RealVal(path_x, self.ctx))
+            self.last_model.update_value(Real("path_y", self.ctx), RealVal(path_y, self.ctx))
+            for name, (cycle_x, cycle_y) in zip(self.get_cycles(), sums):
+                self.last_model.update_value(Real(f'cycle_x_{name}', self.ctx), RealVal(cycle_x, self.ctx))
+                self.last_model.update_value(Real(f'cycle_y_{name}', self.ctx), RealVal(cycle_y, self.ctx))
+        return self.last_model
+
+    """
+    :param alphas: the coefficients of all transitions, starting with the transitions of the path
+    :returns: the sum of the updates of the path times their coefficients
+    """
+    def path_sum(self, alphas):
+        path_x = sum(alpha * to_fraction(item[1]) for item, alpha in zip(self.get_path(), alphas))
+        path_y = sum(alpha * to_fraction(item[2]) for item, alpha in zip(self.get_path(), alphas))
+        return path_x, path_y
+
+    """
+    Check the assertions of the solver, and store the result and the model as result of the last query.
+    While z3 is running, its context is registered with the cancellation token. If the token is already cancelled,
+    the result is unknown without calling z3.
+    """
+    def store_check(self, target_x, target_y):
+        self.last_target = (target_x, target_y)
+        self.last_result = self.run_check()
+        self.last_model = self.solver.model() if self.last_result == sat else None
+        self.backend_values = None
+
+    """
+    Check the assertions of the solver under the given assumptions, see run_check().
+    :returns: the result of the check
+    """
+    def run_check(self, *assumptions):
+        result, self.reason_unknown = run_check(self.solver, self.token, self.metrics, *assumptions)
+        return result
+
+    """
+    Look up the result for the target in the cache. On a hit, the result and the model of the cache are used as
+    result of the last query.
+    :returns: whether the target was found in the cache
+    """
+    def load_cached(self, target_x, target_y):
+        if self.cache is None:
+            return False
+        entry = self.cache.get(self.cache.key(self.get_path(), self.get_cycles(), target_x, target_y))
+        if entry is None:
+            return False
+        self.count("cache_hits")
+        result, values = entry
+        self.last_target = (target_x, target_y)
+        self.last_result = sat if result == "sat" else unsat
+        self.last_model = None
+        self.backend_values = None
+        if self.last_result == sat:
+            names = {alias: name for name, alias in self.variable_aliases().items()}
+            self.last_model = Model(self.ctx)
+            for alias, value in values.items():
+                self.last_model.update_value(Real(names.get(alias, alias), self.ctx), RealVal(value, self.ctx))
+        return True
+
+    """
+    Store the result of the last query in the cache. Unknown results, and models with irrational values are
+    not stored.
+    """
+    def store_cached(self):
+        if self.cache is None or self.last_result not in (sat, unsat):
+            return
+        values = None
+        if self.last_result == sat:
+            aliases = self.variable_aliases()
+            values = dict()
+            model = self.get_model()
+            for decl in model.decls():
+                value = model[decl]
+                if decl.arity() > 0 or not is_arith(value):
+                    continue
+                if not is_rational_value(value):
+                    return
+                values[aliases.get(decl.name(), decl.name())] = str(value)
+        key = self.cache.key(self.get_path(), self.get_cycles(), *self.last_target)
+        self.cache.put(key, str(self.last_result), values)
+
+    """
+    The names of the variables in the encoding depend on the labels of the states. To store a model in the cache,
+    the variables of the transitions and the cycles are renamed by their index.
+    :returns: a dictionary from the name of each variable to its name in the cache
+    """
+    def variable_aliases(self):
+        aliases = dict()
+        for i, item in enumerate(self.get_transitions()):
+            aliases.setdefault(f'a_{item[0]}--{item[3]}', f'a#{i}')
+        for i, name in enumerate(self.get_cycles()):
+            aliases[f'cycle_x_{name}'] = f'cycle_x#{i}'
+            aliases[f'cycle_y_{name}'] = f'cycle_y#{i}'
+        return aliases
+
+    """
+    Verify a list of targets within one solver context.
+    A satisfying model fixes a point reached by the path, and a direction for every cycle. As cycles can be
+    taken any non-negative number of times, every target in the cone of these directions starting from that point
+    is reachable as well. Such targets are answered from earlier models, without calling the solver.
+    If a backend is used, the targets that are not answered from earlier models are verified by the backend.
+    All targets are first checked by the prefilter at once, the rejected targets are not reachable.
+    :param targets: an iterable of (x, y) pairs
+    :returns: a boolean NumPy array, containing for each target whether or not it is reachable. Targets with an
+    unknown result are not reachable in the array.
+    """
+    def verify_many(self, targets):
+        targets = list(targets)
+        if self.prefilter is not None:
+            kinds = self.prefilter.classify(targets)
+        else:
+            kinds = np.full(len(targets), Prefilter.PASSED)
+        results = list()
+        for (target_x, target_y), kind in zip(targets, kinds):
+            if kind != Prefilter.PASSED:
+                self.store_rejected(target_x, target_y, kind)
+                results.append(False)
+                continue
+            if self.witnessed(target_x, target_y):
+                self.count("witness_hits")
+                results.append(True)
+                continue
+            if not self.load_cached(target_x, target_y):
+                if self.backend is not None:
+                    self.solve_backend(target_x, target_y)
+                else:
+                    self.solve_scoped(target_x, target_y)
+                self.store_cached()
+            if self.last_result == sat:
+                self.add_witness()
+            results.append(self.last_result == sat)
+        return np.array(results, dtype=bool)
+
+    """
+    Verify all targets in the grid xs x ys.
+    :returns: a boolean NumPy array of shape (len(xs), len(ys)), where [i, j] represents target (xs[i], ys[j])
+    """
+    def verify_grid(self, xs, ys):
+        results = self.verify_many((x, y) for x in xs for y in ys)
+        return results.reshape(len(xs), len(ys))
 
-        for name, cycle_x, cycle_y in zip(self.get_cycles().keys(), cycles_x, cycles_y):
-            self.solve_cycle(name, cycle_x, cycle_y)
-        sum_x = Sum([cycle_x for cycle_x in cycles_x])
-        sum_y = Sum([cycle_y for cycle_y in cycles_y])
+    """
+    Compute the set of all reachable targets at once, such that targets can be checked without the solver, see
+    ReachableRegion.contains_many().
+    :returns: the ReachableRegion of the linear path scheme
+    :exception: If the linear path scheme has symbolic updates, or transitions sharing their variables
+    """
+    def reachable_region(self):
+        if not (self.is_linear() and self.independent_transitions):
+            raise ValueError("The reachable region needs constant updates and transitions with their own variables.")
+        with self.timer("region"):
+            return ReachableRegion(self.get_path(), self.get_cycles())
 
-        self.solver.add(path_x + sum_x == target_x, path_y + sum_y == target_y)
+    """
+    :returns: the sorted names of the symbolic updates, where an update -X uses parameter X
+    """
+    def get_parameters(self):
+        parameters = set()
+        for item in self.get_transitions():
+            for value in item[1:3]:
+                if isinstance(value, str):
+                    parameters.add(value[1:] if value[0] == '-' else value)
+        return sorted(parameters)
+
+    """
+    Check the target for every combination of values of the parameters in the grid, in one solver session.
+    The encoding stays symbolic: for each value of each parameter, a boolean binds the parameter to the value,
+    and each combination is checked with these booleans as assumptions. Parameters that are not in the grid can
+    take any value.
+    :param grid: a dictionary from the name of a parameter to the list of its values
+    :returns: a dictionary from Result to the list of combinations with that result, where each combination is a
+    tuple with the values of the parameters in the order of the grid
+    :exception: If a parameter in the grid is not a symbolic update of the linear path scheme
+    """
+    def sweep(self, target_x, target_y, grid):
+        unknown_parameters = set(grid) - set(self.get_parameters())
+        if unknown_parameters:
+            raise ValueError(f"Unknown parameters: {', '.join(sorted(unknown_parameters))}.")
+        if not self.encoded:
+            self.solver.reset()
+            self.encode()
+        results = {result: list() for result in Result}
+        self.solver.push()
+        try:
+            self.add_target(target_x, target_y)
+            bindings = list()
+            for name, values in grid.items():
+                literals = list()
+                for i, value in enumerate(values):
+                    literal = Bool(f'bind_{name}_{i}', self.ctx)
+                    self.solver.add(Implies(literal, Real(name, self.ctx) == value))
+                    literals.append((value, literal))
+                bindings.append(literals)
+            for combination in itertools.product(*bindings):
+                result = Result.of(self.run_check(*[literal for _, literal in combination]))
+                results[result].append(tuple(value for value, _ in combination))
+        finally:
+            self.solver.pop()
+        return results
+
+    """
+    Store the point reached by the path, and the direction of every used cycle in the model of the last query.
+    If the model contains irrational values, or rationals too large to convert, it is not stored.
+    """
+    def add_witness(self):
+        if self.backend_values is not None:
+            alphas, sums = self.backend_values
+            point = self.path_sum(alphas)
+            directions = list(sums)
+        else:
+            def value(name):
+                try:
+                    return to_fraction(self.last_model.eval(Real(name, self.ctx), model_completion=True))
+                except ValueError:
+                    # Python limits the number of digits of integers converted from strings
+                    return None
+
+            point = (value("path_x"), value("path_y"))
+            directions = [(value(f'cycle_x_{name}'), value(f'cycle_y_{name}')) for name in self.get_cycles()]
+        if None in point or any(None in direction for direction in directions):
+            return
+        if not self.independent_transitions:
+            # The cycles can not be scaled independently, the model only witnesses its own target
+            point = (point[0] + sum(x for x, y in directions), point[1] + sum(y for x, y in directions))
+            directions = list()
+        directions = [direction for direction in directions if direction != (0, 0)]
+        self.witnesses.appendleft((point, directions))
+
+    """
+    :returns: whether an earlier model shows the target is reachable
+    """
+    def witnessed(self, target_x, target_y):
+        if not self.witnesses:
+            return False
+        target = (to_fraction(target_x), to_fraction(target_y))
+        for point, directions in self.witnesses:
+            if in_cone((target[0] - point[0], target[1] - point[1]), directions):
+                return True
+        return False
 
-        self.solve_negatives()
+    """
+    Assert all constraints that do not depend on the target.
+    """
+    def encode(self):
+        with self.timer("encode"):
+            path_x, path_y = Reals("path_x path_y", self.ctx)
+            cycles_x = [Real(f'cycle_x_{name}', self.ctx) for name in self.get_cycles()]
+            cycles_y = [Real(f'cycle_y_{name}', self.ctx) for name in self.get_cycles()]
+            self.solve_path(path_x, path_y)
 
+            for name, cycle_x, cycle_y in zip(self.get_cycles().keys(), cycles_x, cycles_y):
+                self.solve_cycle(name, cycle_x, cycle_y)
+            sum_x = Sum([cycle_x for cycle_x in cycles_x])
+            sum_y = Sum([cycle_y for cycle_y in cycles_y])
+            self.total_x = path_x + sum_x
+            self.total_y = path_y + sum_y
+
+            self.solve_negatives()
+        self.encoded = True
+
+    def add_target(self, target_x, target_y):
+        self.solver.add(self.total_x == target_x, self.total_y == target_y)
+
+    """
+    Constant updates are folded into the coefficients of alpha, so alpha * update is a linear term.
+    Only symbolic updates result in a product of two variables.
+    """
     def solve_path(self, path_x, path_y):
-        X = [Real(f'x_{item[0]}--{item[3]}') for item in self.get_path()]
-        Y = [Real(f'y_{item[0]}--{item[3]}') for item in self.get_path()]
-        alpha = [Real(f'a_{item[0]}--{item[3]}') for item in self.get_path()]
-        sum_x = Sum([a * x for (a, x) in zip(alpha, X)])
-        sum_y = Sum([a * y for (a, y) in zip(alpha, Y)])
+        alpha = [Real(f'a_{item[0]}--{item[3]}', self.ctx) for item in self.get_path()]
+        x_s = [self.update(item[1]) for item in self.get_path()]
+        y_s = [self.update(item[2]) for item in self.get_path()]
+        sum_x = Sum([a * x for (a, x) in zip(alpha, x_s)])
+        sum_y = Sum([a * y for (a, y) in zip(alpha, y_s)])
         self.solver.add(sum_x == path_x, sum_y == path_y)
 
-        x_s = [Real(item[1]) if isinstance(item[1], str) else item[1] for item in self.get_path()]
-        y_s = [Real(item[2]) if isinstance(item[2], str) else item[2] for item in self.get_path()]
-        for i in range(len(x_s)):
-            self.solver.add(X[i] == x_s[i])
-            self.solver.add(Y[i] == y_s[i])
+        for i in range(len(alpha)):
             self.solver.add(alpha[i] > 0, alpha[i] <= 1)
 
-    def all_true(self, l):
-        result = True
-        for item in l:
-            result = And(result, item)
-        return result
+    """
+    :returns: the update as z3 variable if it is symbolic, the constant update otherwise
+    """
+    def update(self, value):
+        return update_term(value, self.ctx)
+
+    """
+    :returns: whether all updates are constant, in which case the encoding only uses linear real arithmetic
+    """
+    def is_linear(self):
+        return not any(isinstance(item[1], str) or isinstance(item[2], str) for item in self.get_transitions())
 
+    """
+    A cycle is trivial if all its updates are collinear, see cycle_constraints().
+    """
     def solve_cycle(self, name, cycle_x, cycle_y):
-        X = [Real(f'x_{item[0]}--{item[3]}') for item in self.get_cycle(name)]
-        Y = [Real(f'y_{item[0]}--{item[3]}') for item in self.get_cycle(name)]
-        alpha = [Real(f'a_{item[0]}--{item[3]}') for item in self.get_cycle(name)]
-        sum_x = Sum([a * x for (a, x) in zip(alpha, X)])
-        sum_y = Sum([a * y for (a, y) in zip(alpha, Y)])
-        self.solver.add(Or(And(sum_x == cycle_x, sum_y == cycle_y), And(cycle_x == 0, cycle_y == 0)))
-
-        x_s = [Real(item[1]) if isinstance(item[1], str) else item[1] for item in self.get_cycle(name)]
-        y_s = [Real(item[2]) if isinstance(item[2], str) else item[2] for item in self.get_cycle(name)]
-
-        trivial = self.all_true([X[i] * Y[i + 1] == X[i + 1] * Y[i] for i in range(len(X) - 1)])
-        for i in range(len(x_s)):
-            self.solver.add(X[i] == x_s[i])
-            self.solver.add(Y[i] == y_s[i])
-            self.solver.add(Or(And(trivial, alpha[i] >= 0), And(Not(trivial), alpha[i] > 0)))
+        self.solver.add(*cycle_constraints(self.get_cycle(name), cycle_x, cycle_y))
 
     def solve_negatives(self):
         negatives = set()
@@ -99,4 +531,98 @@ class ETRSolver:
             if isinstance(item[2], str) and item[2][0] == '-':
                 negatives.add(item[2])
         for item in negatives:
-            self.solver.add(Real(item) == -Real(item[1:]))
+            self.solver.add(Real(item, self.ctx) == -Real(item[1:], self.ctx))
+
+
+"""
+:returns: the update as z3 variable if it is symbolic, the constant update otherwise
+"""
+def update_term(value, ctx=None):
+    return Real(value, ctx) if isinstance(value, str) else value
+
+
+def all_true(l):
+    result = True
+    for item in l:
+        result = And(result, item)
+    return result
+
+
+"""
+The constraints of a cycle: the sum of the updates scaled by alpha is either (cycle_x, cycle_y), or the cycle is
+not taken and (cycle_x, cycle_y) is 0. A cycle is trivial if all its updates are collinear, then alpha >= 0,
+otherwise alpha > 0. If all updates of the cycle are constant, this is decided before encoding, so the
+constraints on alpha do not depend on the updates.
+:param cycle: the transitions of the cycle
+:param cycle_x: the z3 variable of the sum of the cycle, whose context is used for all terms
+:returns: a list of constraints
+"""
+def cycle_constraints(cycle, cycle_x, cycle_y):
+    alpha = [Real(f'a_{item[0]}--{item[3]}', cycle_x.ctx) for item in cycle]
+    x_s = [update_term(item[1], cycle_x.ctx) for item in cycle]
+    y_s = [update_term(item[2], cycle_x.ctx) for item in cycle]
+    sum_x = Sum([a * x for (a, x) in zip(alpha, x_s)])
+    sum_y = Sum([a * y for (a, y) in zip(alpha, y_s)])
+    constraints = [Or(And(sum_x == cycle_x, sum_y == cycle_y), And(cycle_x == 0, cycle_y == 0))]
+
+    if any(is_expr(value) for value in x_s + y_s):
+        trivial = all_true([x_s[i] * y_s[i + 1] == x_s[i + 1] * y_s[i] for i in range(len(x_s) - 1)])
+    else:
+        trivial = is_trivial([(to_fraction(x), to_fraction(y)) for x, y in zip(x_s, y_s)])
+    for i in range(len(alpha)):
+        if trivial is True:
+            constraints.append(alpha[i] >= 0)
+        elif trivial is False:
+            constraints.append(alpha[i] > 0)
+        else:
+            constraints.append(Or(And(trivial, alpha[i] >= 0), And(Not(trivial), alpha[i] > 0)))
+    return constraints
+
+
+"""
+Check the assertions of the solver under the given assumptions, such that the check can be interrupted by the
+token. The time of the check and the z3 statistics are recorded in the metrics.
+:param token: an optional CancellationToken
+:param metrics: an optional Metrics object
+:returns: the result of the check, and the reason if it is unknown, otherwise None
+"""
+def run_check(solver, token, metrics, *assumptions):
+    ctx = solver.ctx
+    if token is not None:
+        # A cancel between the registration and the start of the check does not interrupt it
+        if not token.register(ctx) or token.cancelled:
+            token.unregister(ctx)
+            return unknown, "canceled"
+    try:
+        with nullcontext() if metrics is None else metrics.timer("check"):
+            result = solver.check(*assumptions)
+    finally:
+        if token is not None:
+            token.unregister(ctx)
+    if metrics is not None:
+        metrics.record_statistics(solver)
+    return result, solver.reason_unknown() if result == unknown else None
+
+
+"""
+:param vector: a 2-dimensional vector
+:param generators: a list of 2-dimensional vectors
+:returns: whether the vector is a non-negative combination of the generators
+"""
+def in_cone(vector, generators):
+    x, y = vector
+    if x == 0 and y == 0:
+        return True
+    for gx, gy in generators:
+        if gx * y - gy * x == 0 and gx * x + gy * y > 0:
+            return True
+    for i, (gx, gy) in enumerate(generators):
+        for hx, hy in generators[i + 1:]:
+            det = gx * hy - gy * hx
+            if det == 0:
+                continue
+            a = (x * hy - y * hx) / det
+            b = (gx * y - gy * x) / det
+            if a >= 0 and b >= 0:
+                return True
+    return False
@@ -0,0 +1,79 @@
+class Transition:
+    """
+    A transition from state p to state q with update (x, y). The states are integer ids, the updates are numbers
+    or the names of symbolic updates.
+    """
+    __slots__ = ("p", "x", "y", "q")
+
+    def __init__(self, p, x, y, q):
+        self.p = p
+        self.x = x
+        self.y = y
+        self.q = q
+
+    def __eq__(self, other):
+        return isinstance(other, Transition) and \
+            (self.p, self.x, self.y, self.q) == (other.p, other.x, other.y, other.q)
+
+    def __hash__(self):
+        return hash((self.p, self.x, self.y, self.q))
+
+    def __repr__(self):
+        return f"Transition({self.p!r}, {self.x!r}, {self.y!r}, {self.q!r})"
+
+
+class LinearPathScheme:
+    """
+    A linear path scheme, with the states labelled uniquely. Each label is a pair of integers: the id of the state
+    in the VASS, and the number of the copy of that state. The transitions refer to the labels by their index.
+    The names of the states are only needed to convert the linear path scheme to json, see self.to_json(). Only
+    the names of the states in the labels are kept, so the linear path scheme stays small when it is sent to
+    another process.
+    :param states: the names of the states of the VASS, by id
+    :param labels: a list of (state id, copy) pairs
+    :param path: the transitions of the path
+    :param cycles: a list with the transitions of each cycle
+    """
+    __slots__ = ("states", "labels", "path", "cycles")
+
+    def __init__(self, states, labels, path, cycles):
+        self.states = {state: states[state] for state, _ in labels}
+        self.labels = labels
+        self.path = path
+        self.cycles = cycles
+
+    """
+    :returns: the name of the label, as the name of the state followed by the number of the copy
+    """
+    def label(self, index):
+        state, copy = self.labels[index]
+        return f"{self.states[state]}_{copy}"
+
+    """
+    Convert the linear path scheme to the format that can be read by the ETRSolver:
+        path: a list of transitions, where each of these transitions have 4 elements:
+            the label of the start state of the transition,
+            the update value for x,
+            the update value for y,
+            the label of the end state of the transition
+        cycles: a dictionary, where each cycle has a unique name c1, c2, ... and points to a list of transitions,
+        which have the same elements as within the path.
+    :returns: the lps in json format
+    """
+    def to_json(self):
+        names = [self.label(index) for index in range(len(self.labels))]
+        data = dict()
+        data["path"] = [[names[item.p], item.x, item.y, names[item.q]] for item in self.path]
+        data["cycles"] = dict()
+        for counter, cycle in enumerate(self.cycles, 1):
+            data["cycles"][f"c{counter}"] = [[names[item.p], item.x, item.y, names[item.q]] for item in cycle]
+        return data
+
+    def __eq__(self, other):
+        return isinstance(other, LinearPathScheme) and self.to_json() == other.to_json()
+
+    # The transitions can be changed, so a linear path scheme can not be a key
+    __hash__ = None
+
+    def __repr__(self):
+        return f"LinearPathScheme({self.to_json()!r})"
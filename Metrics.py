@@ -0,0 +1,98 @@
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+import time
+import weakref
+
+
+class Metrics:
+    """
+    Collects the measurements of the VASS and the ETRSolver. Instrumentation is opt-in: both classes only
+    record measurements if they are given a Metrics object.
+        timings: the total wall time in seconds of each phase
+        calls: the number of times each phase was run
+        counts: counters, like the number of tree nodes, paths, cycles and linear path schemes
+        statistics: the z3 statistics of all checks. Memory and other maximum statistics hold the maximum, all
+        others the sum.
+    :param callback: an optional function, called as callback(kind, name, value) for every measurement, where kind
+    is "time", "count" or "z3"
+    """
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.timings = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.counts = defaultdict(int)
+        self.statistics = dict()
+        # The last statistics of each solver, since z3 accumulates them over all checks of a solver
+        self.snapshots = weakref.WeakKeyDictionary()
+
+    """
+    Context manager that measures the wall time of a phase.
+    :param name: the name of the phase
+    """
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            self.timings[name] += seconds
+            self.calls[name] += 1
+            if self.callback is not None:
+                self.callback("time", name, seconds)
+
+    def count(self, name, value=1):
+        self.counts[name] += value
+        if self.callback is not None:
+            self.callback("count", name, value)
+
+    """
+    Add the statistics of the last check of a z3 solver. z3 sums most statistics over all checks of the solver,
+    so only the difference with the previous call for the same solver is added. The time is that of the last
+    check only, and maximum statistics are compared as they are.
+    :param solver: the z3 solver after the check
+    """
+    def record_statistics(self, solver):
+        statistics = solver.statistics()
+        previous = self.snapshots.get(solver, dict())
+        snapshot = dict()
+        for key in statistics.keys():
+            value = snapshot[key] = statistics.get_key_value(key)
+            if "memory" in key or "max" in key:
+                self.statistics[key] = max(self.statistics.get(key, 0), value)
+            else:
+                if key != "time":
+                    value -= previous.get(key, 0)
+                self.statistics[key] = self.statistics.get(key, 0) + value
+            if self.callback is not None:
+                self.callback("z3", key, value)
+        self.snapshots[solver] = snapshot
+
+    def reset(self):
+        self.timings.clear()
+        self.calls.clear()
+        self.counts.clear()
+        self.statistics.clear()
+
+    """
+    :returns: all measurements as json object
+    """
+    def as_dict(self):
+        return {"timings": dict(self.timings), "calls": dict(self.calls), "counts": dict(self.counts),
+                "statistics": dict(self.statistics)}
+
+
+class Measured:
+    """
+    Mixin for the classes that record their measurements in an optional Metrics object, self.metrics.
+    """
+
+    """
+    :returns: a context manager measuring the time of the phase, if metrics are recorded
+    """
+    def timer(self, name):
+        return nullcontext() if self.metrics is None else self.metrics.timer(name)
+
+    def count(self, name, value=1):
+        if self.metrics is not None:
+            self.metrics.count(name, value)
@@ -0,0 +1,165 @@
+from z3 import *
+from ETRSolver import Result, cycle_constraints, run_check, update_term
+from LinearPathScheme import LinearPathScheme
+from Metrics import Measured
+
+
+class SchemeNode:
+    """
+    A node of the trie of MultiSchemeSolver, for one transition of a path or one cycle. sum_x and sum_y are the sum
+    of all updates from the root up to and including this node.
+    :param constraints: the constraints of the transition or cycle, and of the sum
+    :param schemes: the indices of the linear path schemes that end in this node
+    """
+    __slots__ = ("children", "constraints", "sum_x", "sum_y", "schemes")
+
+    def __init__(self, sum_x, sum_y, constraints=()):
+        self.children = dict()
+        self.constraints = list(constraints)
+        self.sum_x = sum_x
+        self.sum_y = sum_y
+        self.schemes = list()
+
+
+class MultiSchemeSolver(Measured):
+    """
+    Check targets on many linear path schemes with a single z3 solver. Each linear path scheme is a sequence of the
+    transitions of its path, followed by its cycles, sorted such that the order of the cycles does not matter.
+    These sequences are stored in a trie, so linear path schemes with the same prefix share its nodes. Each node
+    has the constraints of its transition or cycle, as in ETRSolver, and the sum of the updates up to the node, in
+    variables named after the node.
+    A target is checked by walking the trie depth first. The constraints of a node are asserted in a new push
+    scope when it is entered, and popped when it is left, so the constraints of a shared prefix are only asserted
+    once for all linear path schemes below it. In each node where linear path schemes end, their sum is compared
+    to the target.
+    As in ETRSolver, the coefficients alpha are named after the labels of the transitions, so transitions of a
+    linear path scheme with the same labels share their coefficient.
+    :param lpss: a list of linear path schemes, as json or as LinearPathScheme
+    :param metrics: an optional Metrics object, to record the time of the encoding and the checks, and the z3
+    statistics
+    :param timeout: the maximum time of each z3 check in milliseconds, None for no limit
+    :param rlimit: the maximum number of z3 resource units of each check, None for no limit
+    :param token: an optional CancellationToken, to interrupt the checks from another thread. The solver then
+    uses its own z3 context, as in ETRSolver.
+    """
+    def __init__(self, lpss, metrics=None, timeout=None, rlimit=None, token=None):
+        self.ctx = None if token is None else Context()
+        self.solver = Solver(ctx=self.ctx)
+        self.metrics = metrics
+        self.token = token
+        if timeout is not None:
+            self.solver.set("timeout", int(timeout))
+        if rlimit is not None:
+            self.solver.set("rlimit", int(rlimit))
+        self.reason_unknown = None
+        self.root = SchemeNode(RealVal(0, self.ctx), RealVal(0, self.ctx))
+        self.nodes = 1
+        self.schemes = 0
+        negatives = set()
+        with self.timer("encode"):
+            for lps in lpss:
+                if isinstance(lps, LinearPathScheme):
+                    lps = lps.to_json()
+                self.add_scheme(lps.get("path", []), list(lps.get("cycles", {}).values()))
+                for item in lps.get("path", []) + [item for cycle in lps.get("cycles", {}).values() for item in cycle]:
+                    negatives.update(value for value in item[1:3] if isinstance(value, str) and value[0] == '-')
+            self.solver.add([Real(item, self.ctx) == -Real(item[1:], self.ctx) for item in sorted(negatives)])
+        self.count("trie_nodes", self.nodes)
+
+    """
+    Add a linear path scheme to the trie, creating the nodes of the part that is not shared with earlier ones.
+    :param path: the transitions of the path
+    :param cycles: a list with the transitions of each cycle
+    """
+    def add_scheme(self, path, cycles):
+        node = self.root
+        tokens = [("path",) + tuple(item) for item in path]
+        tokens += sorted((("cycle",) + tuple(tuple(item) for item in cycle) for cycle in cycles), key=repr)
+        for token in tokens:
+            child = node.children.get(token)
+            if child is None:
+                child = self.new_node(node, token)
+                node.children[token] = child
+            node = child
+        node.schemes.append(self.schemes)
+        self.schemes += 1
+
+    """
+    :param parent: the parent of the new node
+    :param token: the transition ("path", p, x, y, q) or the cycle ("cycle", transitions...) of the new node
+    :returns: the new node, with the constraints of its transition or cycle
+    """
+    def new_node(self, parent, token):
+        sum_x, sum_y = Reals(f'sum_x_{self.nodes} sum_y_{self.nodes}', self.ctx)
+        self.nodes += 1
+        if token[0] == "path":
+            _, p, x, y, q = token
+            alpha = Real(f'a_{p}--{q}', self.ctx)
+            constraints = [alpha > 0, alpha <= 1,
+                           sum_x == parent.sum_x + alpha * update_term(x, self.ctx),
+                           sum_y == parent.sum_y + alpha * update_term(y, self.ctx)]
+        else:
+            cycle_x, cycle_y = Reals(f'cycle_x_{self.nodes - 1} cycle_y_{self.nodes - 1}', self.ctx)
+            constraints = cycle_constraints(token[1:], cycle_x, cycle_y)
+            constraints += [sum_x == parent.sum_x + cycle_x, sum_y == parent.sum_y + cycle_y]
+        return SchemeNode(sum_x, sum_y, constraints)
+
+    """
+    :returns: Result.SAT if the target is reachable in any of the linear path schemes, Result.UNSAT if it is
+    reachable in none, and Result.UNKNOWN otherwise
+    """
+    def verify(self, target_x, target_y):
+        results = self.check_schemes(target_x, target_y, stop=True)
+        if Result.SAT in results:
+            return Result.SAT
+        return Result.UNKNOWN if Result.UNKNOWN in results else Result.UNSAT
+
+    """
+    :returns: for each linear path scheme, in the order in which they were given, whether the target is reachable
+    """
+    def verify_all(self, target_x, target_y):
+        return self.check_schemes(target_x, target_y, stop=False)
+
+    """
+    Walk the trie, and check the target in every node where linear path schemes end.
+    :param stop: whether to stop at the first linear path scheme in which the target is reachable
+    :returns: for each linear path scheme its Result, or None if it was not checked
+    """
+    def check_schemes(self, target_x, target_y, stop):
+        results = [None] * self.schemes
+        scopes = self.solver.num_scopes()
+        try:
+            self.solver.push()
+            if self.check_node(self.root, target_x, target_y, results) and stop:
+                return results
+            stack = [iter(self.root.children.values())]
+            while stack:
+                node = next(stack[-1], None)
+                if node is None:
+                    stack.pop()
+                    self.solver.pop()
+                    continue
+                self.solver.push()
+                self.solver.add(node.constraints)
+                if self.check_node(node, target_x, target_y, results) and stop:
+                    return results
+                stack.append(iter(node.children.values()))
+        finally:
+            self.solver.pop(self.solver.num_scopes() - scopes)
+        return results
+
+    """
+    Check the target for the linear path schemes ending in the node.
+    :returns: whether the target is reachable in one of them
+    """
+    def check_node(self, node, target_x, target_y, results):
+        if not node.schemes:
+            return False
+        self.solver.push()
+        self.solver.add(node.sum_x == target_x, node.sum_y == target_y)
+        result, self.reason_unknown = run_check(self.solver, self.token, self.metrics)
+        result = Result.of(result)
+        self.solver.pop()
+        for scheme in node.schemes:
+            results[scheme] = result
+        return bool(result)
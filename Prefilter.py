@@ -0,0 +1,74 @@
+from ReachableRegion import target_array, to_fraction
+import numpy as np
+
+
+class Prefilter:
+    """
+    Cheap necessary conditions for the reachability of targets in a linear path scheme with constant updates.
+    The coefficients of the path are in (0, 1], so the sum of the path lies in the box between the sum of the
+    negative and the sum of the positive updates in each dimension. The cycles can be taken any number of times,
+    so their sum lies in the cone generated by the updates of all cycles. A reachable target is in the sum of the
+    box and the cone.
+    This sum is described by the normals u of the cone where u.w <= 0 for every update w of the cycles:
+    the target t is not reachable if u.t is larger than the maximum of u.p over the box for such a normal u.
+    These normals are found once, with exact arithmetic. The targets are then checked in NumPy:
+        box: the normals along the axes, which bound the path sum in each dimension
+        cone: the normals perpendicular to the updates of the cycles
+    self.settled counts the targets rejected by each check, and self.passed the targets that were not rejected.
+    :param path: the path of the linear path scheme
+    :param cycles: the dictionary of cycles of the linear path scheme
+    """
+    PASSED = 0
+    BOX = 1
+    CONE = 2
+    # Relative tolerance, such that rounding errors never reject a reachable target
+    TOLERANCE = 1e-9
+
+    def __init__(self, path, cycles):
+        path_updates = [(to_fraction(item[1]), to_fraction(item[2])) for item in path]
+        self.lower = [sum(min(update[k], 0) for update in path_updates) for k in range(2)]
+        self.upper = [sum(max(update[k], 0) for update in path_updates) for k in range(2)]
+        generators = {(to_fraction(item[1]), to_fraction(item[2])) for cycle in cycles.values() for item in cycle}
+        generators.discard((0, 0))
+
+        def normal(u):
+            return all(u[0] * w[0] + u[1] * w[1] <= 0 for w in generators)
+
+        axes = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+        perpendiculars = {(-w[1], w[0]) for w in generators} | {(w[1], -w[0]) for w in generators}
+        self.box_normals, self.box_bounds = self.normals([u for u in axes if normal(u)])
+        self.cone_normals, self.cone_bounds = self.normals([u for u in perpendiculars if normal(u)])
+        self.settled = {"box": 0, "cone": 0}
+        self.passed = 0
+
+    """
+    :param normals: a list of normals as pairs of Fractions
+    :returns: the normals, scaled to length 1 in the maximum norm, as float array, and for each normal the maximum
+    of u.p for p in the box
+    """
+    def normals(self, normals):
+        normals = [(u[0] / max(abs(u[0]), abs(u[1])), u[1] / max(abs(u[0]), abs(u[1]))) for u in normals]
+        bounds = [sum(max(u[k] * self.lower[k], u[k] * self.upper[k]) for k in range(2)) for u in normals]
+        return np.array(normals, dtype=float).reshape(-1, 2), np.array(bounds, dtype=float)
+
+    """
+    :param targets: an iterable of (x, y) pairs
+    :returns: an integer array with for each target Prefilter.BOX or Prefilter.CONE if the target is rejected by
+    that check, or Prefilter.PASSED if the target has to be checked by the solver. Targets that are not rational
+    numbers are never rejected.
+    """
+    def classify(self, targets):
+        targets = target_array(targets)
+        scale = 1 + np.abs(targets).max(axis=1, initial=0) + \
+            max(abs(float(value)) for value in self.lower + self.upper)
+        result = np.full(len(targets), self.PASSED, dtype=int)
+        for kind, normals, bounds in [(self.BOX, self.box_normals, self.box_bounds),
+                                      (self.CONE, self.cone_normals, self.cone_bounds)]:
+            if len(normals):
+                excess = targets @ normals.T - bounds
+                rejected = (excess > self.TOLERANCE * scale[:, None]).any(axis=1) & (result == self.PASSED)
+                result[rejected] = kind
+        self.settled["box"] += int(np.count_nonzero(result == self.BOX))
+        self.settled["cone"] += int(np.count_nonzero(result == self.CONE))
+        self.passed += int(np.count_nonzero(result == self.PASSED))
+        return result
@@ -0,0 +1,261 @@
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from ETRSolver import ETRSolver, Result
+from VASS import VASS
+import argparse
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+
+
+class ReachabilityServer:
+    """
+    Asyncio server answering reachability queries over TCP. Each line a client sends is a json request:
+        id: an optional identifier, copied to the response
+        vass: the VASS, in the format read by VASS
+        targets: an optional list of [x, y] targets, relative to the initial values.
+        If not given, the target of the VASS is used.
+    Each request is answered by a single line with the id and either a list results, containing "sat", "unsat"
+    or "unknown" for each target, or an error. A request line longer than limit bytes is skipped and answered with
+    an error, without an id. Responses are written when they are ready, so they can be in a
+    different order than the requests.
+    The linear path schemes are constructed and checked on a pool of worker processes. Requests wait in a queue
+    of at most max_pending requests. If the queue is full, the server stops reading from the connection until
+    there is room again, so clients are slowed down by TCP flow control.
+    The linear path schemes of the last max_models VASSs are cached by the hash of their json, so repeated
+    queries for the same VASS skip the enumeration.
+    :param workers: the number of worker processes, and the number of requests handled at the same time.
+    If None, the number of processors is used.
+    :param timeout: the maximum time of each z3 check in milliseconds, None for no limit
+    :param limit: the maximum length of a request line in bytes
+    """
+    def __init__(self, host="127.0.0.1", port=0, workers=None, max_pending=64, max_models=128, timeout=None,
+                 limit=1 << 24):
+        self.host = host
+        self.port = port
+        self.workers = workers or os.cpu_count() or 1
+        # Forked workers would inherit the sockets of open connections, and keep them open after they are closed
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+        self.max_pending = max_pending
+        self.max_models = max_models
+        self.timeout = timeout
+        self.limit = limit
+        # Content hash of a VASS to the future of its linear path schemes
+        self.models = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.queue = None
+        self.server = None
+        self.tasks = list()
+
+    """
+    Start listening and start the tasks handling the requests. If port is 0, a free port is chosen, see
+    self.address.
+    """
+    async def start(self):
+        self.queue = asyncio.Queue(self.max_pending)
+        self.tasks = [asyncio.create_task(self.work()) for _ in range(self.workers)]
+        self.server = await asyncio.start_server(self.handle_connection, self.host, self.port,
+                                                 limit=self.limit)
+
+    @property
+    def address(self):
+        return self.server.sockets[0].getsockname()[:2]
+
+    async def serve_forever(self):
+        if self.server is None:
+            await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def close(self):
+        self.server.close()
+        await self.server.wait_closed()
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    """
+    Read the requests of a connection line by line, and put them in the queue. The connection is closed when the
+    client has sent all its requests, and all of them are answered.
+    """
+    async def handle_connection(self, reader, writer):
+        lock = asyncio.Lock()
+        answered = list()
+        try:
+            while True:
+                try:
+                    line = await read_line(reader)
+                except ValueError as e:
+                    await self.send(writer, lock, {"id": None, "error": f"{type(e).__name__}: {e}"})
+                    continue
+                if not line:
+                    break
+                if line.strip():
+                    done = asyncio.get_running_loop().create_future()
+                    answered.append(done)
+                    await self.queue.put((line, writer, lock, done))
+            await asyncio.gather(*answered)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    """
+    Handle the requests in the queue, and write the responses.
+    """
+    async def work(self):
+        while True:
+            line, writer, lock, done = await self.queue.get()
+            try:
+                await self.send(writer, lock, await self.respond(line))
+            except ConnectionError:
+                pass
+            finally:
+                done.set_result(None)
+                self.queue.task_done()
+
+    """
+    Write a response as a line, unless the connection is already closing.
+    :param lock: the lock of the connection, such that responses are not interleaved
+    """
+    async def send(self, writer, lock, response):
+        async with lock:
+            if not writer.is_closing():
+                writer.write((json.dumps(response) + "\n").encode())
+                await writer.drain()
+
+    """
+    :param line: a json request
+    :returns: the json response
+    """
+    async def respond(self, line):
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get("id")
+            data = request["vass"]
+            targets = request.get("targets")
+            if targets is None:
+                targets = [((data.get("end_x") or 0) - (data.get("start_x") or 0),
+                            (data.get("end_y") or 0) - (data.get("start_y") or 0))]
+            lpss, cached = await self.linear_path_schemes(data)
+            loop = asyncio.get_running_loop()
+            results = await loop.run_in_executor(self.executor, check_targets, lpss, targets, self.timeout)
+            return {"id": request_id, "results": results, "cached": cached}
+        except Exception as e:
+            return {"id": request_id, "error": f"{type(e).__name__}: {e}"}
+
+    """
+    Construct the linear path schemes of the VASS on the worker pool, or take them from the cache. Requests for
+    a VASS that is still being constructed wait for the same future. If the construction fails, the VASS is
+    removed from the cache.
+    :returns: the list of linear path schemes, and whether they came from the cache
+    """
+    async def linear_path_schemes(self, data):
+        key = content_hash(data)
+        future = self.models.get(key)
+        cached = future is not None
+        if cached:
+            self.cache_hits += 1
+            self.models.move_to_end(key)
+        else:
+            self.cache_misses += 1
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self.executor, build_lps, data)
+            self.models[key] = future
+            while len(self.models) > self.max_models:
+                self.models.popitem(last=False)
+        try:
+            return await asyncio.shield(future), cached
+        except Exception:
+            if self.models.get(key) is future:
+                del self.models[key]
+            raise
+
+
+"""
+Read a line from the stream. A line longer than the limit of the stream is skipped up to and including its
+newline, so the next line can be read as usual.
+:returns: the line, or an empty bytes object at the end of the stream
+:exception: If the line is longer than the limit
+"""
+async def read_line(reader):
+    try:
+        return await reader.readuntil(b"\n")
+    except asyncio.IncompleteReadError as e:
+        return e.partial
+    except asyncio.LimitOverrunError as e:
+        overrun = e
+    length = 0
+    while overrun is not None:
+        # The bytes that were already searched for the newline can be dropped
+        length += len(await reader.readexactly(overrun.consumed))
+        try:
+            length += len(await reader.readuntil(b"\n"))
+            overrun = None
+        except asyncio.IncompleteReadError as e:
+            length += len(e.partial)
+            overrun = None
+        except asyncio.LimitOverrunError as e:
+            overrun = e
+    raise ValueError(f"Request line of {length} bytes is longer than the limit.")
+
+
+"""
+:returns: the SHA-256 hash of the json object, independent of the order of the keys
+"""
+def content_hash(data):
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
+
+
+"""
+Construct all linear path schemes of a VASS. This is a module level function, such that it can be sent to worker
+processes.
+"""
+def build_lps(data):
+    return VASS(data).linear_path_scheme()
+
+
+"""
+Check all targets on the linear path schemes. Each linear path scheme is encoded once for all targets, and
+targets that are already reachable are not checked again.
+:param timeout: the maximum time of each z3 check in milliseconds, None for no limit
+:returns: for each target "sat", "unsat" or "unknown"
+"""
+def check_targets(lpss, targets, timeout=None):
+    results = [Result.UNSAT] * len(targets)
+    for lps in lpss:
+        etr = ETRSolver(lps, incremental=True, timeout=timeout)
+        for i, (target_x, target_y) in enumerate(targets):
+            if results[i] is not Result.SAT:
+                result = etr.verify(target_x, target_y)
+                if result is not Result.UNSAT:
+                    results[i] = result
+        if all(results):
+            break
+    return [result.value for result in results]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve reachability queries as line-delimited json.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--max-pending", type=int, default=64)
+    parser.add_argument("--max-models", type=int, default=128)
+    parser.add_argument("--timeout", type=int, help="maximum time of each check in milliseconds")
+    parser.add_argument("--limit", type=int, default=1 << 24, help="maximum length of a request line in bytes")
+    args = parser.parse_args()
+    server = ReachabilityServer(args.host, args.port, args.workers, args.max_pending, args.max_models, args.timeout,
+                                args.limit)
+    asyncio.run(server.serve_forever())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+from fractions import Fraction
+from z3 import And, BoolVal, Or, Real, is_expr, is_rational_value
+import math
+import numpy as np
+
+
+class ReachableRegion:
+    """
+    The set of all reachable targets of a linear path scheme with constant updates, where no two transitions
+    share their variables. The path reaches the sum of the updates v scaled by coefficients in (0, 1]. A trivial
+    cycle reaches its closed cone, any non-negative combination of its updates. Any other cycle reaches either 0,
+    or a combination of its updates with only positive coefficients, which is the interior of its cone relative to
+    the plane or line it spans. The sum of such interiors is the interior of the cone of all their updates.
+    The region is the union over all sets S of used non-trivial cycles of the sum of these parts, a convex polygon.
+    Each polygon is the intersection of half-planes u.t <= h(u), for the normals u where u.w <= 0 for every update
+    w of the cycles in S and the trivial cycles, and h(u) the sum of max(0, u.v) over the path. The inequality is
+    strict if the maximum is not reached: if u.v < 0 for some v of the path, or if S is not empty and u.w < 0 for
+    some w of its cycles. The normals are the axes, the updates and their perpendiculars, which contains the
+    normals of every edge, and also bound polygons that are a line, a segment or a point.
+    Sets S with the same valid normals give the same polygon, so the polygons are found by intersecting the sets
+    of valid normals of the cycles, instead of enumerating all sets S.
+    self.polygons is a list with for each polygon a list of (a, b, bound, strict) half-planes, which are
+    a * x + b * y <= bound, or < bound if strict. The coefficients a and b are coprime integers.
+    :param path: the path of the linear path scheme
+    :param cycles: the dictionary of cycles of the linear path scheme
+    """
+    # Relative tolerance, such that targets on the boundary are not moved by rounding errors
+    TOLERANCE = 1e-9
+
+    def __init__(self, path, cycles):
+        path_updates = [(to_fraction(item[1]), to_fraction(item[2])) for item in path]
+        cones = list()
+        trivial_updates = list()
+        for cycle in cycles.values():
+            updates = [(to_fraction(item[1]), to_fraction(item[2])) for item in cycle]
+            if is_trivial(updates):
+                trivial_updates.extend(updates)
+            else:
+                cones.append(updates)
+        generators = set(path_updates) | set(trivial_updates) | {w for updates in cones for w in updates}
+        generators.discard((0, 0))
+        normals = {(1, 0), (-1, 0), (0, 1), (0, -1)}
+        for w in generators:
+            normals |= {integral(u) for u in [w, (-w[0], -w[1]), (-w[1], w[0]), (w[1], -w[0])]}
+        self.normals = sorted(normals)
+        opposite = [self.normals.index((-u[0], -u[1])) for u in self.normals]
+
+        def valid(updates):
+            return sum(1 << i for i, u in enumerate(self.normals) if all(dot(u, w) <= 0 for w in updates))
+
+        trivial = valid(trivial_updates)
+        cone_masks = set()
+        for updates in cones:
+            mask = valid(updates)
+            cone_masks |= {mask & other for other in cone_masks} | {mask}
+        polygons = dict()
+        for mask, used in [(valid([]), False)] + [(mask, True) for mask in sorted(cone_masks)]:
+            polygon = list()
+            for i, u in enumerate(self.normals):
+                if not (mask & trivial) >> i & 1:
+                    continue
+                bound = sum(max(dot(u, v), 0) for v in path_updates)
+                strict = any(dot(u, v) < 0 for v in path_updates) or (used and not mask >> opposite[i] & 1)
+                polygon.append((u[0], u[1], Fraction(bound), strict))
+            polygons[tuple(polygon)] = polygon
+        self.polygons = list(polygons.values())
+        # For the evaluation in NumPy, the normals are scaled to length 1 in the maximum norm
+        self.arrays = list()
+        for polygon in self.polygons:
+            lengths = np.array([max(abs(a), abs(b)) for a, b, _, _ in polygon], dtype=float)
+            normals = np.array([(a, b) for a, b, _, _ in polygon], dtype=float).reshape(-1, 2) / lengths[:, None]
+            bounds = np.array([float(bound) for _, _, bound, _ in polygon], dtype=float) / lengths
+            strict = np.array([strict for _, _, _, strict in polygon], dtype=bool)
+            self.arrays.append((normals, bounds, strict))
+
+    """
+    :param targets: an iterable of (x, y) pairs of exact values, see to_fraction()
+    :returns: a boolean NumPy array with for each target whether it is reachable
+    :exception: If a target is not a rational number
+    """
+    def contains_many(self, targets):
+        targets = target_array(targets)
+        if np.isnan(targets).any():
+            raise ValueError("The targets of a reachable region must be rational numbers.")
+        result = np.zeros(len(targets), dtype=bool)
+        for normals, bounds, strict in self.arrays:
+            scale = 1 + np.abs(targets).max(axis=1, initial=0) + np.abs(bounds).max(initial=0)
+            tolerance = self.TOLERANCE * scale[:, None]
+            excess = targets @ normals.T - bounds
+            inside = (excess < -tolerance) | ((np.abs(excess) <= tolerance) & ~strict)
+            result |= inside.all(axis=1)
+        return result
+
+    """
+    :returns: whether the target is reachable
+    """
+    def contains(self, target_x, target_y):
+        return bool(self.contains_many([(target_x, target_y)])[0])
+
+    """
+    :returns: the region as z3 formula over the variables target_x and target_y
+    """
+    def formula(self, target_x=None, target_y=None):
+        target_x = Real("target_x") if target_x is None else target_x
+        target_y = Real("target_y") if target_y is None else target_y
+        polygons = list()
+        for polygon in self.polygons:
+            half_planes = list()
+            for a, b, bound, strict in polygon:
+                term = a * target_x + b * target_y
+                half_planes.append(term < bound if strict else term <= bound)
+            polygons.append(And(*half_planes) if half_planes else BoolVal(True))
+        return Or(*polygons)
+
+
+"""
+A cycle is trivial if all its consecutive updates are collinear, see ETRSolver.cycle_constraints().
+:param updates: a sequence of (x, y) updates with exact values
+"""
+def is_trivial(updates):
+    return all(updates[i][0] * updates[i + 1][1] == updates[i + 1][0] * updates[i][1]
+               for i in range(len(updates) - 1))
+
+
+def dot(u, v):
+    return u[0] * v[0] + u[1] * v[1]
+
+
+"""
+:returns: the vector scaled to coprime integers
+"""
+def integral(vector):
+    x, y = Fraction(vector[0]), Fraction(vector[1])
+    denominator = math.lcm(x.denominator, y.denominator)
+    x, y = int(x * denominator), int(y * denominator)
+    divisor = math.gcd(x, y)
+    return x // divisor, y // divisor
+
+
+"""
+:param value: an int, float, string or z3 rational value
+:returns: the exact value as a Fraction, or None if the value is not rational
+"""
+def to_fraction(value):
+    if is_expr(value):
+        if not is_rational_value(value):
+            return None
+        return Fraction(value.numerator_as_long(), value.denominator_as_long())
+    return Fraction(str(value))
+
+
+"""
+:param targets: an iterable of (x, y) pairs of exact values, see to_fraction()
+:returns: the targets as float array of shape (n, 2), with NaN for each value that is not a rational number
+"""
+def target_array(targets):
+    def convert(value):
+        try:
+            value = to_fraction(value)
+        except (ValueError, ZeroDivisionError):
+            return math.nan
+        return math.nan if value is None else float(value)
+
+    return np.array([[convert(x), convert(y)] for x, y in targets], dtype=float).reshape(-1, 2)
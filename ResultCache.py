@@ -0,0 +1,92 @@
+import hashlib
+import json
+import sqlite3
+from fractions import Fraction
+
+
+class ResultCache:
+    """
+    Persistent cache of the results of the ETRSolver, stored in an SQLite database.
+    Each entry maps a key, see ResultCache.key(), to the result of the check (sat or unsat) and the model.
+    If the cache holds more than max_entries entries, the least recently used entries are evicted.
+    :param path: the file of the database. If ":memory:", the cache is not persistent.
+    :param max_entries: the maximum number of entries in the cache
+    """
+    def __init__(self, path=":memory:", max_entries=100000):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS results "
+                                "(key TEXT PRIMARY KEY, result TEXT NOT NULL, model TEXT, used INTEGER NOT NULL)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS results_used ON results (used)")
+        self.connection.commit()
+        self.clock = self.connection.execute("SELECT COALESCE(MAX(used), 0) FROM results").fetchone()[0]
+
+    """
+    Create the key for a linear path scheme and a target. The states are renamed in order of their first
+    appearance in the path and the cycles, and the names of the cycles are dropped, so the key does not depend on
+    the labels chosen when exporting the linear path scheme.
+    :param path: the path of the linear path scheme
+    :param cycles: the dictionary of cycles of the linear path scheme
+    :returns: the key, as a hexadecimal SHA-256 hash
+    """
+    @staticmethod
+    def key(path, cycles, target_x, target_y):
+        names = dict()
+
+        def normalize(transitions):
+            result = list()
+            for p, x, y, q in transitions:
+                p = names.setdefault(str(p), len(names))
+                q = names.setdefault(str(q), len(names))
+                result.append([p, x, y, q])
+            return result
+
+        data = {"path": normalize(path),
+                "cycles": [normalize(cycle) for cycle in cycles.values()],
+                "target": [str(Fraction(str(target_x))), str(Fraction(str(target_y)))]}
+        return hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
+
+    """
+    :returns: the result and the model stored for the key, or None if the key is not in the cache
+    """
+    def get(self, key):
+        row = self.connection.execute("SELECT result, model FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.clock += 1
+        self.connection.execute("UPDATE results SET used = ? WHERE key = ?", (self.clock, key))
+        self.connection.commit()
+        result, model = row
+        return result, None if model is None else json.loads(model)
+
+    """
+    Store the result and the model for the key, and evict the least recently used entries if the cache is full.
+    :param result: the result of the check, as string
+    :param model: a json serializable model, or None
+    """
+    def put(self, key, result, model=None):
+        self.clock += 1
+        self.connection.execute("INSERT OR REPLACE INTO results (key, result, model, used) VALUES (?, ?, ?, ?)",
+                                (key, result, None if model is None else json.dumps(model), self.clock))
+        excess = len(self) - self.max_entries
+        if excess > 0:
+            self.connection.execute("DELETE FROM results WHERE key IN "
+                                    "(SELECT key FROM results ORDER BY used LIMIT ?)", (excess,))
+        self.connection.commit()
+
+    def clear(self):
+        self.connection.execute("DELETE FROM results")
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def __contains__(self, key):
+        return self.connection.execute("SELECT 1 FROM results WHERE key = ?", (key,)).fetchone() is not None
@@ -1,13 +1,38 @@
+import bisect
 import json
+import os
 from collections import defaultdict
-import numpy as np
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import time
+from ETRSolver import ETRSolver, Result
+from LinearPathScheme import LinearPathScheme, Transition
+from Metrics import Measured
 
 
 class Tree:
-    def __init__(self, node, parent=None):
+    """
+    A node of the reachability tree. If expand is given, the children are only created by expand(self) when they
+    are first accessed, so only the part of the tree that is visited is constructed. Otherwise the node is a leaf,
+    until children are added with self.add_child().
+    """
+    def __init__(self, node, parent=None, expand=None):
         self.parent = parent
-        self.children = list()
         self.node = node
+        self.depth = 0 if parent is None else parent.depth + 1
+        self.expand = expand
+        self._children = list() if expand is None else None
+
+    @property
+    def children(self):
+        if self._children is None:
+            self._children = self.expand(self)
+        return self._children
+
+    """
+    :returns: whether the children of the node are created
+    """
+    def is_expanded(self):
+        return self._children is not None
 
     def add_child(self, node):
         self.children.append(node)
@@ -20,17 +45,25 @@ class Tree:
             parent = parent.parent
         return parents
 
+    """
+    Traverse the tree iteratively, so deep trees do not reach the recursion limit. Lazy nodes are expanded.
+    :returns: a generator of the nodes of the tree in preorder
+    """
+    def preorder(self):
+        stack = [self]
+        while stack:
+            tree = stack.pop()
+            yield tree
+            stack.extend(reversed(tree.children))
+
     def __str__(self, level=0):
-        ret = repr(self.node) + " "
-        for child in self.children:
-            ret += child.__str__()
-        return ret
+        return "".join(repr(tree.node) + " " for tree in self.preorder())
 
     def __repr__(self):
         return str(self.node)
 
 
-class VASS:
+class VASS(Measured):
     """
     This function initializes all class variables. The states are all converted to strings.
     If multiple transitions exist between two states, a new state is created as intermediate state for
@@ -48,30 +81,71 @@ class VASS:
             q: the state where the transition ends
             x: the update value for x
             y: the update value for y
+    :param metrics: an optional Metrics object, to record the time and the size of each phase
+    """
+    def __init__(self, data, metrics=None):
+        self.set_query(data)
+        # The transitions, with the ids of the states
+        self.edges = []
+        # Index of the edges: an id for each state, the update for each (p, q) and the sorted adjacency list
+        self.states = list()
+        self.state_ids = dict()
+        self.updates = dict()
+        self.adj_list = None
+        # The strongly connected components of the states reachable from self.start
+        self.components = None
+        self.edge_ctr = defaultdict(int)
+        self.metrics = metrics
+        # The linear path schemes with an unknown result in the last call of self.is_reachable()
+        self.unknown_lps = list()
+        # Whether the last tree or enumeration left out nodes, because of its maximum depth or number of nodes
+        self.truncated = False
+        for edge in data.get("edges", []):
+            self.add_edge(edge["p"], edge["x"], edge["y"], edge["q"])
+
+    """
+    Set the start and end state, and the initial and target values. The edges in data are not used.
+    :param data: json object with start, end, start_x, start_y, end_x and end_y, see self.__init__()
     """
-    def __init__(self, data):
+    def set_query(self, data):
         self.start = str(data.get("start"))
         self.end = str(data.get("end"))
         self.init_x = data.get("start_x")
         self.init_y = data.get("start_y")
         self.target_x = data.get("end_x")
-        self.target_y = data.get("end_x")
-        self.edges = []
-        edges = data.get("edges", [])
-        states = self.get_states(edges)
-        edge_ctr = np.zeros(len(states), dtype=int)
-        for edge in edges:
-            p = str(edge["p"])
-            q = str(edge["q"])
-            x = edge["x"]
-            y = edge["y"]
-            if self.edge_exists(p, q):
-                new_state = f'{p}-{edge_ctr[states.index(edge["p"])]}'
-                edge_ctr[states.index(edge["p"])] += 1
-                self.edges.append({"p": p, "x": 0, "y": 0, "q": new_state})
-                self.edges.append({"p": new_state, "x": x, "y": y, "q": q})
-            else:
-                self.edges.append({"p": p, "x": x, "y": y, "q": q})
+        self.target_y = data.get("end_y")
+        self.components = None
+
+    """
+    Add an edge to the VASS. If a transition already exists between p and q, a new intermediate state is created.
+    :param p: the state from where the transition starts
+    :param x: the update value for x
+    :param y: the update value for y
+    :param q: the state where the transition ends
+    """
+    def add_edge(self, p, x, y, q):
+        p = str(p)
+        q = str(q)
+        if self.edge_exists(p, q):
+            new_state = f'{p}-{self.edge_ctr[p]}'
+            self.edge_ctr[p] += 1
+            self.add_transition(p, 0, 0, new_state)
+            self.add_transition(new_state, x, y, q)
+        else:
+            self.add_transition(p, x, y, q)
+
+    """
+    Add a transition to self.edges, and update the index. There should be no transition between p and q yet.
+    """
+    def add_transition(self, p: str, x, y, q: str):
+        for state in (p, q):
+            if state not in self.state_ids:
+                self.state_ids[state] = len(self.states)
+                self.states.append(state)
+        self.edges.append(Transition(self.state_ids[p], x, y, self.state_ids[q]))
+        self.updates[(p, q)] = (x, y)
+        self.adj_list = None
+        self.components = None
 
     """
     :param p: the state where the transition would start
@@ -82,18 +156,15 @@ class VASS:
     :rtype: bool
     """
     def edge_exists(self, p: str, q: str) -> bool:
-        for edge in self.edges:
-            if edge["p"] == p and edge["q"] == q:
-                return True
-        return False
+        return (p, q) in self.updates
 
     """
-    :param edges: The list of all edges. If None, self.edges is used. 
+    :param edges: A list of edges in json format. If None, the edges of the VASS are used. 
     :returns: all the states within the VASS
     """
     def get_states(self, edges=None):
         if edges is None:
-            edges = self.edges
+            return list(self.states)
         states = set()
         for item in edges:
             states.add(item["p"])
@@ -101,14 +172,18 @@ class VASS:
         return list(states)
 
     """
+    The adjacency list is constructed once, and reused until a new transition is added.
     :returns: the sorted adjacency list for each state
     """
     def adjacency_list(self):
-        adj_list = defaultdict(list)
-        for item in self.edges:
-            adj_list[item["p"]].append(item["q"])
-            adj_list[item["p"]] = sorted(adj_list[item["p"]])
-        return adj_list
+        if self.adj_list is None:
+            adj_list = defaultdict(list)
+            for p, q in self.updates:
+                adj_list[p].append(q)
+            for successors in adj_list.values():
+                successors.sort()
+            self.adj_list = adj_list
+        return self.adj_list
 
     """
     :param p: the state where the transition would start
@@ -119,35 +194,54 @@ class VASS:
     :exception: If no transition exists between p and q
     """
     def get_transition(self, p: str, q: str):
-        for item in self.edges:
-            if item["p"] == p and item["q"] == q:
-                return item["x"], item["y"]
-        raise IndexError(f"Transition not found between state {p} and {q}.")
+        try:
+            return self.updates[(p, q)]
+        except KeyError:
+            raise IndexError(f"Transition not found between state {p} and {q}.")
 
     """
-    This function creates an adjacency tree starting in self.start, and uses 
-    self.const_tree_rec() to recursively create the tree
+    This function creates an adjacency tree starting in self.start. A node is a leaf if its state is already on
+    the path above its parent. The tree is constructed iteratively, by expanding the nodes in preorder.
+    If the tree is lazy, the children of each node are only created when they are accessed, see Tree.children.
+    If the depth or the number of nodes is limited, self.truncated is set if a node is left out by the limits.
+    :param max_depth: the maximum depth of the nodes, where the root has depth 0, None for no limit
+    :param max_nodes: the maximum number of nodes in the tree, None for no limit
+    :param lazy: whether the nodes are expanded on demand
     :returns: the adjacency tree
     """
-    def construct_reachability_tree(self):
-        tree = Tree(self.start)
+    def construct_reachability_tree(self, max_depth=None, max_nodes=None, lazy=False):
         adj_list = self.adjacency_list()
-        self.const_tree_rec(tree, adj_list)
+        nodes = 1
+
+        def expand(tree):
+            nonlocal nodes
+            children = list()
+            parents = tree.get_parents()
+            for item in adj_list[tree.node]:
+                if max_nodes is not None and nodes >= max_nodes:
+                    self.truncated = True
+                    break
+                nodes += 1
+                self.count("tree_nodes")
+                leaf = item in parents
+                if not leaf and max_depth is not None and tree.depth + 1 >= max_depth:
+                    leaf = True
+                    if adj_list[item]:
+                        self.truncated = True
+                children.append(Tree(item, parent=tree, expand=None if leaf else expand))
+            return children
+
+        with self.timer("tree"):
+            self.count("tree_nodes")
+            leaf = max_depth is not None and max_depth <= 0
+            self.truncated = leaf and bool(adj_list[self.start])
+            tree = Tree(self.start, expand=None if leaf else expand)
+            if not lazy:
+                for _ in tree.preorder():
+                    pass
         return tree
 
     """
-    This function recursively constructs a tree, until all new children are already in the list of parents. 
-    :param tree: the tree as the parent, to create new children for
-    :param adj_list: the adjacency list to search for all children
-    :param depth: to give the depth of the tree
-    """
-    def const_tree_rec(self, tree, adj_list, depth=0):
-        for item in adj_list[tree.node]:
-            new_tree = Tree(item, parent=tree)
-            tree.add_child(new_tree)
-            if item not in tree.get_parents():
-                self.const_tree_rec(new_tree, adj_list, depth + 1)
-    """
     Rotate the cycle, such that the given state becomes the start and end state. 
     If the given state is not in the cycle, or the given state is already the start and end state, do nothing.
     :param cycle: Cycle to rotate
@@ -161,65 +255,176 @@ class VASS:
         return cycle[idx:] + cycle[1:idx] + [start]
 
     """
-    Check if a cycle already exists in a given list of cycles. If a rotation of the cycle exists, the cycle exists.
-    :param cycles: List of all cycles to check
-    :param new_cycle: cycle to check if it exists in the list
-    :returns: Boolean whether the cycle exists in the list or not
+    The canonical form of a cycle is its lexicographically smallest rotation. All rotations of a cycle have the
+    same canonical form, so it can be used as key to store cycles in a hash set.
+    :param cycle: the cycle, where the first and the last state are the same
+    :returns: the canonical form of the cycle as tuple, without repeating the first state at the end
+    """
+    def canonical_cycle(self, cycle):
+        states = cycle[:-1]
+        smallest = min(states)
+        return min(tuple(states[i:] + states[:i]) for i, state in enumerate(states) if state == smallest)
+
+    """
+    Check if a cycle already exists in a given set of cycles. If a rotation of the cycle exists, the cycle exists.
+    :param cycles: Set of the canonical forms of all cycles to check
+    :param new_cycle: cycle to check if it exists in the set
+    :returns: Boolean whether the cycle exists in the set or not
     :rtype: bool
     """
     def cycle_exists(self, cycles, new_cycle):
-        filtered = filter(lambda x: len(x) == len(new_cycle), cycles)
-        for cycle in filtered:
-            if len(set(cycle) & set(new_cycle)) == len(set(new_cycle)):
-                if self.rotate_cycle(cycle, new_cycle[0]) == new_cycle:
-                    return True
-        return False
-
-    """
-    Find all paths and cycles for the linear path schemes.
-    The reachability tree is iteratively traversed using preorder traversal.
-    If self.end is found, the path from the start to this state is added to all paths. 
-    If a state is found that also appears in the list of it's parents, a cycle is found, and this cycle is added to 
-    the list of all cycles, if this cycle is not already in the list.
+        return self.canonical_cycle(new_cycle) in cycles
+
+    """
+    Compute the strongly connected components of the states reachable from self.start, see
+    strongly_connected_components(). The components are computed once, and reused until a new transition is added.
+    :returns: the list of components in topological order, starting with the component of self.start, and a
+    dictionary from each state to the index of its component
+    """
+    def strongly_connected_components(self):
+        if self.components is None:
+            components = strongly_connected_components([self.start], self.adjacency_list())
+            component_of = {state: i for i, component in enumerate(components) for state in component}
+            self.components = components, component_of
+        return self.components
+
+    """
+    :returns: for each strongly connected component, the set of indices of the components it has a transition to
+    """
+    def condensation(self):
+        components, component_of = self.strongly_connected_components()
+        adj_list = self.adjacency_list()
+        successors = [set() for _ in components]
+        for i, component in enumerate(components):
+            for state in component:
+                successors[i].update(component_of[item] for item in adj_list[state])
+            successors[i].discard(i)
+        return successors
+
+    """
+    A state is relevant if it is reachable from self.start, and self.end is reachable from it. Only relevant
+    states can be on a path from self.start to self.end, or on a cycle that can be added to such a path.
+    All states of a strongly connected component are relevant or not, so this is decided on the condensation.
+    :returns: the set of relevant states
+    """
+    def relevant_states(self):
+        components, component_of = self.strongly_connected_components()
+        if self.end not in component_of:
+            return set()
+        successors = self.condensation()
+        relevant = [False] * len(components)
+        for i in reversed(range(len(components))):
+            relevant[i] = i == component_of[self.end] or any(relevant[j] for j in successors[i])
+        return {state for i, component in enumerate(components) if relevant[i] for state in component}
+
+    """
+    Enumerate all paths and cycles, without constructing the reachability tree.
+    The simple paths starting in self.start are traversed depth first, in the same order as the preorder traversal
+    of the reachability tree, but only through relevant states, see self.relevant_states(). Only the current path
+    is kept in memory, together with a set of the states on it. If self.end is found, the current path is yielded
+    as path.
+    The cycles are enumerated in each strongly connected component of relevant states separately. Each cycle is
+    yielded once, starting in its state that was found first, by searching the simple paths from each state of the
+    component back to it, through the states of the component that were found later. As in Johnson's algorithm,
+    the states that were found later are split in strongly connected components again, and a state is only
+    searched from if it is on a cycle within its own component.
+    Each state that is found is a node of the search. The search does not continue below nodes at max_depth, and
+    stops when max_nodes nodes are visited. If a node is left out, self.truncated is set.
+    :param max_depth: the maximum depth of the nodes, where the first state of the search has depth 0, None for no
+    limit
+    :param max_nodes: the maximum number of visited nodes, None for no limit
+    :returns: a generator of tuples ("path", path) and ("cycle", cycle)
+    """
+    def iter_paths_and_cycles(self, max_depth=None, max_nodes=None):
+        self.truncated = False
+        adj_list = self.adjacency_list()
+        components, _ = self.strongly_connected_components()
+        relevant = self.relevant_states()
+        nodes = 0
+
+        """
+        :param allowed: a function deciding whether the paths can pass through a state
+        :param close: the state at which a path is yielded
+        :returns: a generator of the simple paths from root to close, or None if max_nodes is reached
+        """
+        def search(root, allowed, close):
+            nonlocal nodes
+            stack = [root]
+            on_stack = {root}
+            successors = [iter(adj_list[root])]
+            nodes += 1
+            while successors:
+                item = next(successors[-1], None)
+                if item is None:
+                    successors.pop()
+                    on_stack.remove(stack.pop())
+                    continue
+                if max_nodes is not None and nodes >= max_nodes:
+                    self.truncated = True
+                    yield None
+                    return
+                nodes += 1
+                if item == close:
+                    yield stack + [item]
+                elif item not in on_stack and allowed(item):
+                    if max_depth is None or len(stack) < max_depth:
+                        stack.append(item)
+                        on_stack.add(item)
+                        successors.append(iter(adj_list[item]))
+                    elif adj_list[item]:
+                        self.truncated = True
+
+        if self.start != self.end and self.start in relevant:
+            for path in search(self.start, relevant.__contains__, self.end):
+                if path is None:
+                    return
+                yield "path", path
+        for component in components:
+            if component[0] not in relevant:
+                continue
+            position = {state: i for i, state in enumerate(component)}
+            remaining = component
+            while remaining:
+                remaining_set = set(remaining)
+                restricted = {state: [item for item in adj_list[state] if item in remaining_set] for state in remaining}
+                cyclic = [part for part in strongly_connected_components(remaining, restricted)
+                          if len(part) > 1 or part[0] in restricted[part[0]]]
+                if not cyclic:
+                    break
+                part = min(cyclic, key=lambda part: min(position[state] for state in part))
+                root = min(part, key=position.get)
+                part = set(part)
+                for cycle in search(root, part.__contains__, root):
+                    if cycle is None:
+                        return
+                    yield "cycle", cycle
+                remaining = [state for state in remaining if position[state] > position[root]]
+
+    """
+    Find all paths and cycles for the linear path schemes, using self.iter_paths_and_cycles(). 
+    Cycles are only added to the list of all cycles, if this cycle is not already in the list. This is checked
+    in constant time per state, by keeping the canonical forms of all found cycles in a set.
+    If the depth or the number of nodes is limited, only the paths and cycles found within the limits are returned.
+    :param max_depth: the maximum depth of the search, see self.iter_paths_and_cycles()
+    :param max_nodes: the maximum number of visited nodes, see self.iter_paths_and_cycles()
     :returns: a list containing all different paths from self.start to self.end, and a list of all cycles within 
-    the VASS that can be reached from self.start.
+    the VASS through relevant states, see self.relevant_states().
     """
-    def find_paths_and_cycles(self):
-        tree = self.construct_reachability_tree()
+    def find_paths_and_cycles(self, max_depth=None, max_nodes=None):
         paths = list()
         cycles = list()
-
-        stack = list()
-        preorder = list()
-        preorder.append(tree.node)
-        stack.append(tree)
-        while len(stack) > 0:
-            flag = False
-            if not stack[-1].children:
-                stack.pop()
-            else:
-                par = stack[-1]
-                for child in par.children:
-                    if child not in preorder:
-                        stack.append(child)
-                        preorder.append(child)
-                        if child.node == self.end:
-                            if child.node not in child.get_parents():
-                                paths.append(list(reversed([child.node] + child.get_parents())))
-                        if child.node in child.get_parents():
-                            cycle = list()
-                            cycle.insert(0, child.node)
-                            for item in child.get_parents():
-                                cycle.insert(0, item)
-                                if item == child.node:
-                                    break
-                            if not self.cycle_exists(cycles, cycle):
-                                cycles.append(cycle)
-                            break
-                        flag = True
-                        break
-                if not flag:
-                    stack.pop()
+        known_cycles = set()
+        with self.timer("enumeration"):
+            for kind, item in self.iter_paths_and_cycles(max_depth, max_nodes):
+                if kind == "path":
+                    paths.append(item)
+                else:
+                    key = self.canonical_cycle(item)
+                    if key not in known_cycles:
+                        known_cycles.add(key)
+                        cycles.append(item)
+        self.count("paths", len(paths))
+        self.count("cycles", len(cycles))
         return paths, cycles
 
     """
@@ -232,136 +437,377 @@ class VASS:
         have a state in these cycles, and we flatten these cycles and add them to the path. 
         For each of these newly flattened cycles, we create a separate lps. 
         This is repeated until all cycles are added to a lps, or no more cycles can be added.
-        :returns: a list of linear path schemes. 
+        Each lps is yielded as soon as it is exported, so only one lps has to be kept in memory at a time.
+    A cycle that shares a state with the path, but does not start on it, is rotated to start in its first state on
+    the path. The states of each cycle, and the cycles through each state are indexed once. While flattening, the added
+    cycles are kept sorted by length, and the number of cycles left to flatten through each state is counted, so
+    only the cycles through the states of the flattened cycle are checked against the path.
+    A cycle can be taken zero times, so an lps is subsumed by an earlier lps with the same path and a superset of
+    its cycles. If prune is True, subsumed linear path schemes are not yielded.
+        :param paths: the paths from self.start to self.end. If None, self.find_paths_and_cycles() is used.
+        :param cycles: the cycles within the VASS. If None, self.find_paths_and_cycles() is used.
+        :param prune: whether to leave out linear path schemes that are subsumed by an earlier one
+        :returns: a generator of linear path schemes. 
     """
-    def linear_path_scheme(self):
-        paths, cycles = self.find_paths_and_cycles()
-        print("paths", len(paths))
-        print("cycles", len(cycles))
-        lpss = list()
+    def iter_linear_path_schemes(self, paths=None, cycles=None, prune=True):
+        if paths is None or cycles is None:
+            paths, cycles = self.find_paths_and_cycles()
+        cycle_sets = [set(cycle) for cycle in cycles]
+        cycle_keys = [self.canonical_cycle(cycle) for cycle in cycles]
+        incidence = defaultdict(list)
+        for j, cycle_set in enumerate(cycle_sets):
+            for state in cycle_set:
+                incidence[state].append(j)
+        # For each path without copies, the sets of cycles of the yielded linear path schemes
+        emitted = defaultdict(list)
+
+        def export(path, basic_cycles):
+            if prune:
+                path_key = tuple(state for i, state in enumerate(path) if i == 0 or path[i - 1] != state)
+                cycles_key = frozenset(cycle_keys[j] for _, j in basic_cycles)
+                if any(cycles_key <= other for other in emitted[path_key]):
+                    self.count("pruned_lps")
+                    return None
+                emitted[path_key].append(cycles_key)
+            return self.export_lps(path, [cycle for cycle, _ in basic_cycles])
+
         for path in paths:
-            # print(path)
-            visited = list()
+            path = list(path)
+            path_set = set(path)
+            # Copies of states to insert before their first occurrence in the path
+            copies = defaultdict(int)
+            visited = set()
             to_flatten = list()
             basic_cycles = list()
-            for cycle in cycles:
-                flag = True
-                if cycle[0] not in path:
-                    intersection = list(set(cycle) & set(path))
-                    if intersection:
-                        cycle = self.rotate_cycle(cycle, intersection[0])
-                    else:
-                        flag = False
-                        if cycle not in to_flatten:
-                            to_flatten.append(cycle)
-                if flag:
-                    basic_cycles.append(cycle)
-                    if cycle[0] not in visited:
-                        visited.append(cycle[0])
-                    else:
-                        path.insert(path.index(cycle[0]), cycle[0])
-            lpss.append(self.export_lps(path, basic_cycles))
+            for j, cycle in enumerate(cycles):
+                if cycle[0] not in path_set:
+                    start = first_on_path(cycle, path_set)
+                    if start is None:
+                        to_flatten.append(j)
+                        continue
+                    cycle = self.rotate_cycle(cycle, start)
+                basic_cycles.append((cycle, j))
+                if cycle[0] not in visited:
+                    visited.add(cycle[0])
+                else:
+                    copies[cycle[0]] += 1
+            path = insert_copies(path, copies)
+            lps = export(path, basic_cycles)
+            if lps is not None:
+                yield lps
 
+            # The added cycles, sorted by decreasing length and then by the order in which they were added
+            added_cycles = sorted(((-len(cycle), i, cycle) for i, (cycle, _) in enumerate(basic_cycles)))
+            flatten_states = defaultdict(int)
+            for j in to_flatten:
+                for state in cycle_sets[j]:
+                    flatten_states[state] += 1
             while to_flatten:
-                added_cycles = sorted(basic_cycles, key=len, reverse=True)
-                all_states = set([j for i in to_flatten for j in i])
                 cycle_to_flatten = None
-                for added_cycle in added_cycles:
-                    intersection = list(set(added_cycle) & all_states)
-                    if intersection:
+                for _, _, added_cycle in added_cycles:
+                    if any(state in flatten_states for state in added_cycle):
                         cycle_to_flatten = added_cycle
                         break
                 if cycle_to_flatten is None:
                     break
-                path[path.index(cycle_to_flatten[0]) + 1:path.index(cycle_to_flatten[0]) + 1] = cycle_to_flatten[1:]
-                visited = list()
+                index = path.index(cycle_to_flatten[0]) + 1
+                path[index:index] = cycle_to_flatten[1:]
+                path_set = set(path)
+                candidates = {j for state in cycle_to_flatten for j in incidence[state]}
+                copies = defaultdict(int)
+                visited = set()
                 to_remove = list()
-                for cycle in to_flatten:
-                    intersection = list(set(cycle) & set(path))
-                    if intersection:
-                        to_remove.append(cycle)
-                        cycle = self.rotate_cycle(cycle, intersection[0])
-                        basic_cycles.append(cycle)
+                for j in to_flatten:
+                    if j not in candidates:
+                        continue
+                    start = first_on_path(cycles[j], path_set)
+                    if start is not None:
+                        to_remove.append(j)
+                        cycle = self.rotate_cycle(cycles[j], start)
+                        bisect.insort(added_cycles, (-len(cycle), len(basic_cycles), cycle))
+                        basic_cycles.append((cycle, j))
                         if cycle[0] not in visited:
-                            visited.append(cycle[0])
+                            visited.add(cycle[0])
                         else:
-                            path.insert(path.index(cycle[0]), cycle[0])
-                lpss.append(self.export_lps(path, basic_cycles))
-                for cycle in to_remove:
-                    to_flatten.remove(cycle)
-        return lpss
+                            copies[cycle[0]] += 1
+                path = insert_copies(path, copies)
+                lps = export(path, basic_cycles)
+                if lps is not None:
+                    yield lps
+                for j in to_remove:
+                    to_flatten.remove(j)
+                    for state in cycle_sets[j]:
+                        flatten_states[state] -= 1
+                        if flatten_states[state] == 0:
+                            del flatten_states[state]
+
+    """
+    Constructs a list of all linear path schemes, see self.iter_linear_path_schemes().
+    The number of paths and cycles is recorded in the metrics.
+    :returns: a list of linear path schemes. 
+    """
+    def linear_path_scheme(self):
+        paths, cycles = self.find_paths_and_cycles()
+        return list(self.iter_linear_path_schemes(paths, cycles))
 
     """
     Label all states in the lps uniquely, in a way that there is at most one cycle on each state in the path, 
-    and there are no cycles starting on cycles. 
+    and there are no cycles starting on cycles. A label is a pair of the id of the state and the number of the copy
+    of that state. The first and last state of a cycle have the label of the state in the path where the cycle is
+    taken.
     :param path: the list of the path in the lps (can contain duplicate labels)
     :param cycles: the list of all cycles in the lps (can contain duplicate labels)
-    :returns: paths and cycles where labels are renamed to have no duplicates. 
+    :returns: paths and cycles where the states are replaced by their (state id, copy) label. 
     """
     def label_unique(self, path, cycles):
-        states = self.get_states()
-        unique_ctr = np.zeros(len(states), dtype=int)
+        state_ids = self.state_ids
+        unique_ctr = [0] * len(state_ids)
 
         new_path = list()
         for item in path:
-            new_item = f"{item}_{unique_ctr[states.index(item)]}"
-            unique_ctr[states.index(item)] += 1
-            new_path.append(new_item)
+            state = state_ids[item]
+            new_path.append((state, unique_ctr[state]))
+            unique_ctr[state] += 1
 
-        unique_ctr_cycle = np.zeros(len(states), dtype=int)
+        unique_ctr_cycle = [0] * len(state_ids)
         new_cycles = list()
         for cycle in cycles:
             new_cycle = list()
             for i, item in enumerate(cycle):
+                state = state_ids[item]
                 if i == 0 or i == len(cycle) - 1:
-                    new_item = f"{item}_{unique_ctr_cycle[states.index(item)]}"
-                    new_cycle.append(new_item)
+                    new_cycle.append((state, unique_ctr_cycle[state]))
                     if i == len(cycle) - 1:
-                        unique_ctr_cycle[states.index(item)] += 1
+                        unique_ctr_cycle[state] += 1
                 else:
-                    new_item = f"{item}_{unique_ctr[states.index(item)]}"
-                    unique_ctr[states.index(item)] += 1
-                    new_cycle.append(new_item)
+                    new_cycle.append((state, unique_ctr[state]))
+                    unique_ctr[state] += 1
             new_cycles.append(new_cycle)
         return new_path, new_cycles
 
     """
-    Exports the lps to the format that can be read by the ETRSolver:
-        path: a list of transitions, where each of these transitions have 4 elements: 
-            the start state of the transition, 
-            the update value for x, 
-            the update value for y, 
-            the end state of the transition
-        cycles: a dictionary, where each cycle has a unique name and points to a list of transitions, 
-        which have the same elements as within the path.
+    Exports the lps as LinearPathScheme, see LinearPathScheme.to_json() for the format that can be read by the
+    ETRSolver. The updates are looked up by the ids of the states, so the names of the states are not needed.
+    Consecutive copies of the same state in the path are linked with update (0, 0).
     :param path: the list of the path in the lps (can contain duplicate labels)
     :param cycles: the list of all cycles in the lps (can contain duplicate labels)
-    :returns: the lps in json format
+    :returns: the lps as LinearPathScheme
     """
     def export_lps(self, path, cycles):
-        path, cycles = self.label_unique(path, cycles)
-        data = dict()
-        data["path"] = list()
-        data["cycles"] = dict()
-        for i in range(len(path) - 1):
-            p = path[i]
-            q = path[i + 1]
-            orig_p = p[:p.rfind('_')]
-            orig_q = q[:q.rfind('_')]
-            if orig_p == orig_q:
-                x, y = (0, 0)
-            else:
-                x, y = self.get_transition(orig_p, orig_q)
-            data["path"].append([p, x, y, q])
-        counter = 0
-        for cycle in cycles:
-            counter += 1
-            data["cycles"][f"c{counter}"] = list()
-            for i in range(len(cycle) - 1):
-                p = cycle[i]
-                q = cycle[i + 1]
-                orig_p = p[:p.rfind('_')]
-                orig_q = q[:q.rfind('_')]
-                x, y = self.get_transition(orig_p, orig_q)
-                data["cycles"][f"c{counter}"].append([p, x, y, q])
-        return data
+        with self.timer("export"):
+            with self.timer("label_unique"):
+                path, cycles = self.label_unique(path, cycles)
+            labels = dict()
+            names = self.states
+
+            def transitions(states, link):
+                indices = [labels.setdefault(label, len(labels)) for label in states]
+                result = list()
+                for i in range(len(states) - 1):
+                    p = states[i][0]
+                    q = states[i + 1][0]
+                    x, y = (0, 0) if link and p == q else self.updates[(names[p], names[q])]
+                    result.append(Transition(indices[i], x, y, indices[i + 1]))
+                return result
+
+            lps_path = transitions(path, True)
+            lps_cycles = [transitions(cycle, False) for cycle in cycles]
+            lps = LinearPathScheme(self.states, list(labels), lps_path, lps_cycles)
+        self.count("lps")
+        return lps
+
+    """
+    Check whether the target values can be reached in self.end, starting from the initial values in self.start.
+    The target is reachable if any of the linear path schemes is satisfiable.
+    The linear path schemes are verified by a pool of processes, each with its own z3 context, while they are
+    being constructed. At most two linear path schemes per worker are in flight, and the next ones are only
+    constructed as their checks complete. As soon as one linear path scheme is satisfiable, the construction stops and the remaining
+    work is cancelled: checks that are still queued are dropped, and the worker processes of the checks that are
+    already running are terminated.
+    The linear path schemes with an unknown result are stored in self.unknown_lps. If the budget runs out or the
+    token is cancelled, the remaining linear path schemes are dropped in the same way.
+    :param workers: the number of worker processes. If None, the number of processors is used.
+    If 1, the linear path schemes are verified in this process, and the z3 statistics are recorded in the metrics.
+    :param timeout: the maximum time of each check in milliseconds, None for no limit
+    :param rlimit: the maximum number of z3 resource units of each check, None for no limit
+    :param token: an optional CancellationToken to stop the check from another thread
+    :param budget: the maximum time of the whole check in seconds, None for no limit
+    :returns: Result.SAT if the target is reachable, Result.UNSAT if it is not, and Result.UNKNOWN if no linear
+    path scheme is satisfiable but some could not be decided
+    :rtype: Result
+    """
+    def is_reachable(self, workers=None, timeout=None, rlimit=None, token=None, budget=None):
+        lpss = iter(self.iter_linear_path_schemes())
+        target_x = (self.target_x or 0) - (self.init_x or 0)
+        target_y = (self.target_y or 0) - (self.init_y or 0)
+        deadline = None if budget is None else time.monotonic() + budget
+        self.unknown_lps = list()
+
+        def stopped():
+            return token is not None and token.cancelled or deadline is not None and time.monotonic() >= deadline
+
+        if workers == 1:
+            for lps in lpss:
+                if stopped():
+                    return Result.UNKNOWN
+                result = lps_reachable(lps, target_x, target_y, self.metrics, check_timeout(timeout, deadline),
+                                       rlimit, token)
+                if result:
+                    return Result.SAT
+                if result is Result.UNKNOWN:
+                    self.unknown_lps.append(lps)
+            return Result.UNKNOWN if self.unknown_lps else Result.UNSAT
+
+        executor = ProcessPoolExecutor(max_workers=workers)
+        futures = dict()
+
+        def collect(done):
+            found = False
+            for future in done:
+                lps = futures.pop(future)
+                result = future.result()
+                if result is Result.UNKNOWN:
+                    self.unknown_lps.append(lps)
+                found = found or bool(result)
+            return found
+
+        # Only a few linear path schemes per worker are queued, the next ones are constructed as checks complete
+        capacity = 2 * (workers or os.cpu_count() or 1)
+        # Wake up regularly to notice a cancelled token
+        poll = None if token is None else 0.05
+        try:
+            while True:
+                while lpss is not None and len(futures) < capacity and not stopped():
+                    lps = next(lpss, None)
+                    if lps is None:
+                        lpss = None
+                        break
+                    future = executor.submit(lps_reachable, lps, target_x, target_y, None,
+                                             check_timeout(timeout, deadline), rlimit)
+                    futures[future] = lps
+                if stopped():
+                    return Result.UNKNOWN
+                if not futures:
+                    return Result.UNKNOWN if self.unknown_lps else Result.UNSAT
+                remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+                done, _ = wait(futures, timeout=min_timeout(poll, remaining), return_when=FIRST_COMPLETED)
+                if collect(done):
+                    return Result.SAT
+        finally:
+            if futures:
+                terminate_workers(executor)
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+"""
+:returns: the first state of the cycle that is on the path, or None if the cycle and the path are disjoint
+"""
+def first_on_path(cycle, path_set):
+    return next((state for state in cycle if state in path_set), None)
+
+
+"""
+Insert copies of states before their first occurrence in the path.
+:param copies: the number of copies to insert for each state
+:returns: the path with the copies
+"""
+def insert_copies(path, copies):
+    if not copies:
+        return path
+    result = list()
+    for state in path:
+        if copies.get(state):
+            result.extend([state] * copies.pop(state))
+        result.append(state)
+    return result
+
+
+"""
+Tarjan's algorithm, without recursion.
+:param roots: the states to start the search from, in order
+:param adj_list: the successors of each state. States that are not in adj_list have no successors.
+:returns: the strongly connected components of the states reachable from the roots, in topological order, where
+the states of each component are in the order in which they were found
+"""
+def strongly_connected_components(roots, adj_list):
+    index = dict()
+    low = dict()
+    stack = list()
+    on_stack = set()
+    components = list()
+    for root in roots:
+        if root in index:
+            continue
+        index[root] = low[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(adj_list.get(root, ())))]
+        while work:
+            state, successors = work[-1]
+            item = next(successors, None)
+            if item is None:
+                work.pop()
+                if work:
+                    low[work[-1][0]] = min(low[work[-1][0]], low[state])
+                if low[state] == index[state]:
+                    component = list()
+                    while not component or component[-1] != state:
+                        component.append(stack.pop())
+                        on_stack.remove(component[-1])
+                    components.append(component[::-1])
+            elif item not in index:
+                index[item] = low[item] = len(index)
+                stack.append(item)
+                on_stack.add(item)
+                work.append((item, iter(adj_list.get(item, ()))))
+            elif item in on_stack:
+                low[state] = min(low[state], index[item])
+    # Tarjan's algorithm finds the components in reverse topological order
+    components.reverse()
+    return components
+
+
+"""
+Terminate the worker processes of the executor, such that the checks they are running stop immediately. z3 can
+not be interrupted from another process, and shutdown() waits for the running checks to finish.
+"""
+def terminate_workers(executor):
+    if hasattr(executor, "terminate_workers"):
+        executor.terminate_workers()
+        return
+    # Before Python 3.14, the processes are only available as private attribute
+    for process in list((executor._processes or {}).values()):
+        if process.is_alive():
+            process.terminate()
+
+
+"""
+:param timeout: the timeout of a single check in milliseconds, or None
+:param deadline: the deadline of the whole check, as time.monotonic() value, or None
+:returns: the timeout for the next check in milliseconds, such that it ends before the deadline, or None
+"""
+def check_timeout(timeout, deadline):
+    if deadline is None:
+        return timeout
+    remaining = max(int((deadline - time.monotonic()) * 1000), 1)
+    return min_timeout(timeout, remaining)
+
+
+def min_timeout(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return min(a, b)
+
+
+"""
+Verify a single linear path scheme. This is a module level function, such that it can be sent to worker processes.
+:param lps: the linear path scheme, as exported by VASS.export_lps
+:param metrics: an optional Metrics object, only used within the same process
+:param token: an optional CancellationToken, only used within the same process
+:returns: whether the target is reachable with the linear path scheme, as Result
+"""
+def lps_reachable(lps, target_x, target_y, metrics=None, timeout=None, rlimit=None, token=None):
+    etr = ETRSolver(lps, metrics=metrics, timeout=timeout, rlimit=rlimit, token=token)
+    return etr.verify(target_x, target_y)
@@ -0,0 +1,361 @@
+from collections.abc import Mapping, Sequence
+from contextlib import contextmanager, nullcontext
+from LinearPathScheme import Transition
+from VASS import VASS
+import gc
+import json
+import numpy as np
+import re
+import struct
+import sys
+
+
+class VASSLoader:
+    """
+    Load a VASS from json without keeping the whole file in memory. The file is read in chunks of chunk_size
+    characters, and each edge is added to the VASS as soon as it is parsed, so duplicate edges are split with an
+    intermediate state along the way, see VASS.add_edge(). Only the top level object is parsed incrementally, so
+    the edges can be in any order with the other keys of the VASS.
+    :param chunk_size: the number of characters read at a time
+    """
+    def __init__(self, chunk_size=1 << 16):
+        self.chunk_size = chunk_size
+
+    """
+    :param source: the name of a json file, "-" for stdin, or a file object in text mode
+    :param metrics: an optional Metrics object for the VASS
+    :returns: the VASS
+    """
+    def load(self, source, metrics=None):
+        vass = VASS(dict(), metrics=metrics)
+        data = dict()
+        with paused_gc():
+            for key, value in self.iter_items(source):
+                if key == "edges":
+                    vass.add_edge(value["p"], value["x"], value["y"], value["q"])
+                else:
+                    data[key] = value
+        vass.set_query(data)
+        return vass
+
+    """
+    :param source: the name of a json file, "-" for stdin, or a file object in text mode
+    :returns: a generator of the (key, value) pairs of the top level object, where the edges are yielded one by
+    one as ("edges", edge)
+    :exception: If the json is not an object, or is not valid
+    """
+    def iter_items(self, source):
+        if source == "-":
+            context = nullcontext(sys.stdin)
+        elif isinstance(source, str):
+            context = open(source, "r", encoding="utf-8")
+        else:
+            context = nullcontext(source)
+        with context as file:
+            stream = JSONStream(file, self.chunk_size)
+            stream.expect("{")
+            if stream.peek() == "}":
+                return
+            while True:
+                key = stream.value()
+                stream.expect(":")
+                if key == "edges":
+                    stream.expect("[")
+                    if stream.peek() == "]":
+                        stream.expect("]")
+                    else:
+                        while True:
+                            yield key, stream.value()
+                            if stream.expect(",]") == "]":
+                                break
+                else:
+                    yield key, stream.value()
+                if stream.expect(",}") == "}":
+                    break
+
+
+class JSONStream:
+    """
+    A buffer over a text file, from which json values are decoded one at a time. Text before the current position
+    is dropped when the next chunk is read.
+    """
+    WHITESPACE = re.compile(r"[ \t\n\r]*")
+    # The characters that can continue a number
+    NUMBER = frozenset("0123456789.eE+-")
+
+    def __init__(self, file, chunk_size):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.position = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    """
+    :returns: whether a chunk was read, False at the end of the file
+    """
+    def read(self):
+        chunk = self.file.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+        return True
+
+    """
+    Skip whitespace.
+    :returns: the next character, or None at the end of the file
+    """
+    def peek(self):
+        while True:
+            self.position = self.WHITESPACE.match(self.buffer, self.position).end()
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self.read():
+                return None
+
+    """
+    :param characters: the characters that are allowed next
+    :returns: the next character, which is consumed
+    :exception: If the next character is not one of the characters
+    """
+    def expect(self, characters):
+        character = self.peek()
+        if character is None or character not in characters:
+            raise ValueError(f"Expected one of {characters!r} at {self.describe()}.")
+        self.position += 1
+        return character
+
+    """
+    Decode the next value. A number can continue in the next chunk, also after a part that is a number by itself,
+    such as "1." in "1.5". So a number is only accepted if the next character can not continue it, or the file
+    has ended.
+    :returns: the next json value
+    """
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+                if self.eof or end < len(self.buffer) and \
+                        not (type(value) in (int, float) and self.buffer[end] in self.NUMBER):
+                    self.position = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.read()
+
+    def describe(self):
+        return f"{self.buffer[self.position:self.position + 20]!r}" if self.position < len(self.buffer) else "end"
+
+
+"""
+Binary snapshot of a VASS, after duplicate edges are split. The file starts with a header: the magic bytes, the
+version, the length of the metadata, and the metadata as json, with the states, the names of the symbolic
+updates, the query and the counters of the intermediate states. The edges follow at an offset aligned to 8
+bytes, as array of EDGE_DTYPE, such that they can be memory-mapped. An update is stored in 8 bytes with its kind:
+an integer, a float, or the index of the name of a symbolic update. The fields x_float and y_float are the same
+bytes as x and y, read as float.
+"""
+MAGIC = b"VASSSNAP"
+VERSION = 2
+HEADER = struct.Struct("<8sIQ")
+EDGE_DTYPE = np.dtype({"names": ["p", "q", "x", "y", "x_float", "y_float", "x_kind", "y_kind"],
+                       "formats": ["<i4", "<i4", "<i8", "<i8", "<f8", "<f8", "i1", "i1"],
+                       "offsets": [0, 4, 8, 16, 8, 16, 24, 25], "itemsize": 26})
+INT, FLOAT, SYMBOL = 0, 1, 2
+
+
+"""
+Write a binary snapshot of the VASS.
+:param vass: the VASS
+:param path: the name of the snapshot file
+"""
+def save_snapshot(vass, path):
+    symbols = dict()
+    edges = np.zeros(len(vass.edges), dtype=EDGE_DTYPE)
+    edges["p"] = [edge.p for edge in vass.edges]
+    edges["q"] = [edge.q for edge in vass.edges]
+    for name in ("x", "y"):
+        updates = [encode_update(getattr(edge, name), symbols) for edge in vass.edges]
+        kinds = np.array([kind for _, kind in updates], dtype="i1")
+        edges[f"{name}_kind"] = kinds
+        edges[name] = [0 if kind == FLOAT else value for value, kind in updates]
+        edges[f"{name}_float"][kinds == FLOAT] = [value for value, kind in updates if kind == FLOAT]
+    metadata = {"start": vass.start, "end": vass.end,
+                "start_x": vass.init_x, "start_y": vass.init_y, "end_x": vass.target_x, "end_y": vass.target_y,
+                "states": vass.states, "symbols": list(symbols), "edge_ctr": dict(vass.edge_ctr),
+                "edges": len(edges)}
+    metadata = json.dumps(metadata).encode()
+    padding = -(HEADER.size + len(metadata)) % 8
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(metadata)))
+        f.write(metadata)
+        f.write(b"\0" * padding)
+        f.write(edges.tobytes())
+
+
+"""
+Load a VASS from a binary snapshot. The edges are memory-mapped, and stay in the file: self.edges and
+self.updates of the VASS decode them when they are accessed, see SnapshotEdges and SnapshotUpdates.
+:param path: the name of the snapshot file
+:param metrics: an optional Metrics object for the VASS
+:returns: the VASS
+:exception: If the file is not a snapshot of a supported version
+"""
+def load_snapshot(path, metrics=None):
+    with open(path, "rb") as f:
+        magic, version, length = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a VASS snapshot of version {VERSION}.")
+        metadata = json.loads(f.read(length))
+    offset = HEADER.size + length + (-(HEADER.size + length) % 8)
+    vass = VASS(dict(), metrics=metrics)
+    vass.set_query(metadata)
+    vass.states = list(metadata["states"])
+    vass.state_ids = {state: i for i, state in enumerate(vass.states)}
+    if metadata["edges"]:
+        rows = np.memmap(path, dtype=EDGE_DTYPE, mode="r", offset=offset, shape=(metadata["edges"],))
+    else:
+        rows = np.zeros(0, dtype=EDGE_DTYPE)
+    vass.edges = SnapshotEdges(rows, metadata["symbols"])
+    vass.updates = SnapshotUpdates(rows, metadata["symbols"], vass.states, vass.state_ids)
+    vass.edge_ctr.update(metadata["edge_ctr"])
+    return vass
+
+
+class SnapshotEdges(Sequence):
+    """
+    The transitions of a VASS loaded from a snapshot. Each transition is decoded from its row when it is accessed.
+    Transitions that are added to the VASS later are kept in a list.
+    :param rows: the memory-mapped array of EDGE_DTYPE
+    :param symbols: the names of the symbolic updates
+    """
+    def __init__(self, rows, symbols):
+        self.rows = rows
+        self.symbols = symbols
+        self.added = list()
+
+    def __len__(self):
+        return len(self.rows) + len(self.added)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if index >= len(self.rows):
+            return self.added[index - len(self.rows)]
+        row = self.rows[index]
+        return Transition(int(row["p"]), decode_update(row, "x", self.symbols),
+                          decode_update(row, "y", self.symbols), int(row["q"]))
+
+    def append(self, transition):
+        self.added.append(transition)
+
+
+class SnapshotUpdates(Mapping):
+    """
+    The updates of a VASS loaded from a snapshot, by the pair of the names of the states. A pair is looked up by
+    binary search in the keys p * n + q of the rows, for the n states of the snapshot, so only the sorted keys are
+    kept in memory. Updates that are added to the VASS later are kept in a dictionary.
+    :param rows: the memory-mapped array of EDGE_DTYPE
+    :param symbols: the names of the symbolic updates
+    :param states: the names of the states of the VASS, by id
+    :param state_ids: the ids of the states of the VASS, by name
+    """
+    # The number of rows that are converted to Python objects at a time while iterating
+    BLOCK = 1 << 16
+
+    def __init__(self, rows, symbols, states, state_ids):
+        self.rows = rows
+        self.symbols = symbols
+        self.states = states
+        self.state_ids = state_ids
+        self.size = len(states)
+        keys = rows["p"].astype(np.int64) * self.size + rows["q"]
+        self.order = np.argsort(keys, kind="stable")
+        self.keys = keys[self.order]
+        self.added = dict()
+
+    """
+    :returns: the index of the row of the pair of states, or None if there is none
+    """
+    def find(self, key):
+        p, q = (self.state_ids.get(state, self.size) for state in key)
+        if p >= self.size or q >= self.size:
+            return None
+        i = int(np.searchsorted(self.keys, p * self.size + q))
+        if i < len(self.keys) and self.keys[i] == p * self.size + q:
+            return int(self.order[i])
+        return None
+
+    def __getitem__(self, key):
+        if key in self.added:
+            return self.added[key]
+        index = self.find(key)
+        if index is None:
+            raise KeyError(key)
+        row = self.rows[index]
+        return decode_update(row, "x", self.symbols), decode_update(row, "y", self.symbols)
+
+    """
+    Add the update of a new transition.
+    :exception: If the transition is in the snapshot
+    """
+    def __setitem__(self, key, value):
+        if self.find(key) is not None:
+            raise ValueError(f"The transition {key} is stored in the snapshot, and can not be changed.")
+        self.added[key] = value
+
+    def __iter__(self):
+        for start in range(0, len(self.rows), self.BLOCK):
+            block = self.rows[start:start + self.BLOCK]
+            yield from zip(map(self.states.__getitem__, block["p"].tolist()),
+                           map(self.states.__getitem__, block["q"].tolist()))
+        yield from self.added
+
+    def __len__(self):
+        return len(self.rows) + len(self.added)
+
+
+"""
+Pause the garbage collector while the index of a VASS is built. The index only adds objects without reference
+cycles, but the collector would traverse them again and again as they are created.
+"""
+@contextmanager
+def paused_gc():
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+"""
+:param symbols: a dictionary from the names of the symbolic updates to their index, to which new names are added
+:returns: the update as int or float, and its kind
+"""
+def encode_update(value, symbols):
+    if isinstance(value, str):
+        return symbols.setdefault(value, len(symbols)), SYMBOL
+    if isinstance(value, int):
+        return value, INT
+    return value, FLOAT
+
+
+"""
+:param row: a row of EDGE_DTYPE
+:param name: "x" or "y"
+:returns: the update, as int, float or name of the symbolic update
+"""
+def decode_update(row, name, symbols):
+    kind = row[f"{name}_kind"]
+    if kind == FLOAT:
+        return float(row[f"{name}_float"])
+    value = int(row[name])
+    return value if kind == INT else symbols[value]
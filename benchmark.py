@@ -0,0 +1,154 @@
+from ETRSolver import ETRSolver
+from VASS import VASS
+import argparse
+import json
+import platform
+import random
+import subprocess
+import time
+import tracemalloc
+import z3
+
+PHASES = ["tree", "enumeration", "export", "encoding", "check"]
+
+
+"""
+Generate a random 2-dimensional VASS. States 0 to states - 1 form a path from the start to the end, so the end is
+always reachable in the graph. Every other pair of states gets an edge with the given density, and the given
+number of edges from a state back to an earlier state is added to create cycles. Updates are random integers,
+except for the updates of randomly chosen edges, which get one of the symbolic parameters.
+:param states: the number of states
+:param density: the probability for each other pair of states to get an edge
+:param cycles: the number of back edges
+:param parameters: the number of symbolic parameters, named P0, P1, ...
+:param seed: the seed of the random generator, the same seed results in the same VASS
+:returns: json object with the VASS, in the format read by VASS
+"""
+def random_vass(states, density=0.2, cycles=2, parameters=0, seed=0):
+    rng = random.Random(seed)
+    pairs = {(p, p + 1) for p in range(states - 1)}
+    for p in range(states):
+        for q in range(p + 2, states):
+            if rng.random() < density:
+                pairs.add((p, q))
+    for _ in range(cycles):
+        q = rng.randrange(states)
+        p = rng.randrange(q, states)
+        pairs.add((p, q))
+    edges = [{"p": p, "x": rng.randint(-5, 5), "y": rng.randint(-5, 5), "q": q} for p, q in sorted(pairs)]
+    positions = [(edge, key) for edge in edges for key in ["x", "y"]]
+    for i, (edge, key) in enumerate(rng.sample(positions, min(parameters, len(positions)))):
+        edge[key] = f'P{i}'
+    return {"start": 0, "start_x": 0, "start_y": 0,
+            "end": states - 1, "end_x": rng.randint(-10, 10), "end_y": rng.randint(-10, 10),
+            "edges": edges}
+
+
+"""
+Run a function and measure its duration and the peak memory allocated while it runs.
+:returns: the result of the function, and a dictionary with the seconds and the peak memory in bytes
+"""
+def measure(function, *args):
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    result = function(*args)
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] - before
+    return result, {"seconds": seconds, "peak_bytes": max(peak, 0)}
+
+
+def encode_all(lpss):
+    solvers = [ETRSolver(lps, incremental=True) for lps in lpss]
+    for etr in solvers:
+        etr.encode()
+    return solvers
+
+
+def check_all(solvers, target_x, target_y):
+    return [bool(etr.verify(target_x, target_y)) for etr in solvers]
+
+
+"""
+Benchmark all phases for one VASS: the construction of the reachability tree, the enumeration of the paths and
+cycles, the export of the linear path schemes, the z3 encoding, and the z3 check of all linear path schemes.
+:param data: json object with the VASS
+:param tree: whether to benchmark the construction of the reachability tree, which grows exponentially
+:returns: a dictionary with the measurements of each phase, and the number of paths, cycles, linear path
+schemes and satisfiable linear path schemes
+"""
+def benchmark(data, tree=True):
+    vass = VASS(data)
+    phases = dict()
+    if tree:
+        _, phases["tree"] = measure(vass.construct_reachability_tree)
+    (paths, cycles), phases["enumeration"] = measure(vass.find_paths_and_cycles)
+    lpss, phases["export"] = measure(lambda: list(vass.iter_linear_path_schemes(paths, cycles)))
+    solvers, phases["encoding"] = measure(encode_all, lpss)
+    target_x = (vass.target_x or 0) - (vass.init_x or 0)
+    target_y = (vass.target_y or 0) - (vass.init_y or 0)
+    results, phases["check"] = measure(check_all, solvers, target_x, target_y)
+    return {"phases": phases, "paths": len(paths), "cycles": len(cycles), "lps": len(lpss), "sat": sum(results)}
+
+
+"""
+Benchmark random VASSs for every number of states. Each configuration is repeated with different seeds, and for
+each phase the median duration and the largest peak memory are reported.
+:returns: json object with the environment and the results of every configuration
+"""
+def run(states, density=0.2, cycles=2, parameters=0, repeat=3, seed=0, tree=True):
+    tracemalloc.start()
+    results = list()
+    try:
+        for n in states:
+            runs = [benchmark(random_vass(n, density, cycles, parameters, seed + i), tree) for i in range(repeat)]
+            phases = dict()
+            for phase in PHASES:
+                measurements = [item["phases"][phase] for item in runs if phase in item["phases"]]
+                if measurements:
+                    seconds = sorted(measurement["seconds"] for measurement in measurements)
+                    phases[phase] = {"seconds": seconds[len(seconds) // 2],
+                                     "peak_bytes": max(measurement["peak_bytes"] for measurement in measurements)}
+            results.append({"states": n, "density": density, "cycles": cycles, "parameters": parameters,
+                            "phases": phases,
+                            "paths": [item["paths"] for item in runs], "found_cycles": [item["cycles"] for item in runs],
+                            "lps": [item["lps"] for item in runs], "sat": [item["sat"] for item in runs]})
+    finally:
+        tracemalloc.stop()
+    return {"version": version(), "python": platform.python_version(), "z3": z3.get_version_string(),
+            "repeat": repeat, "seed": seed, "results": results}
+
+
+"""
+:returns: the current git commit, or None if it is not available
+"""
+def version():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the phases of the VASS reachability check.")
+    parser.add_argument("--states", type=int, nargs="+", default=[4, 6, 8, 10])
+    parser.add_argument("--density", type=float, default=0.2)
+    parser.add_argument("--cycles", type=int, default=2)
+    parser.add_argument("--parameters", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-tree", action="store_true", help="skip the construction of the reachability tree")
+    parser.add_argument("--output", help="file to write the results to, printed if not given")
+    args = parser.parse_args()
+    report = run(args.states, args.density, args.cycles, args.parameters, args.repeat, args.seed,
+                 not args.no_tree)
+    if args.output is None:
+        print(json.dumps(report, indent=2))
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
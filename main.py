@@ -1,6 +1,6 @@
 from ETRSolver import ETRSolver
-from VASS import VASS
-import json
+from Metrics import Metrics
+from VASSLoader import VASSLoader
 
 
 def main():
@@ -15,13 +15,14 @@ def main():
     # print(etr.solve(0, 0))
     # etr = ETRSolver(data)
     # print(etr.solve(1, 1))
-    with open('vass.json', 'r') as f:
-        data = json.load(f)
-    vass = VASS(data)
+    metrics = Metrics()
+    vass = VASSLoader().load('vass.json', metrics=metrics)
     # print(vass.get_states())
     # print(vass.adjacency_list())
     # vass.construct_reachability_tree()
-    print(vass.linear_path_scheme())
+    print([lps.to_json() for lps in vass.linear_path_scheme()])
+    print("paths", metrics.counts["paths"])
+    print("cycles", metrics.counts["cycles"])
 
 
 if __name__ == '__main__':
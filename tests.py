@@ -1,5 +1,47 @@
-from ETRSolver import ETRSolver
+from CancellationToken import CancellationToken
+from ETRSolver import ETRSolver, Result
+from LinearPathScheme import Transition
+from Metrics import Metrics
+from MultiSchemeSolver import MultiSchemeSolver
+from Prefilter import Prefilter
+from ReachabilityServer import ReachabilityServer
+from ResultCache import ResultCache
+from VASS import VASS, lps_reachable
+from VASSLoader import VASSLoader, load_snapshot, save_snapshot
+import benchmark
+from z3 import Goal, Model, Probe, Real, RealVal, Solver, main_ctx, unsat
+import asyncio
+from fractions import Fraction
+import concurrent.futures
+import io
+import json
+import os
+import pickle
+import multiprocessing
+import tempfile
+import time
 import unittest
+import unittest.mock
+
+
+"""
+Check a linear path scheme, but keep the worker busy for a minute if the target is not reachable.
+"""
+def slow_unless_reachable(lps, target_x, target_y, *args):
+    result = lps_reachable(lps, target_x, target_y)
+    if not result:
+        time.sleep(60)
+    return result
+
+
+"""
+A token that is cancelled right after a check registers its context, but before the check starts.
+"""
+class LateToken(CancellationToken):
+    def register(self, ctx):
+        registered = super().register(ctx)
+        self.cancel()
+        return registered
 
 
 class TestETRSolver(unittest.TestCase):
@@ -74,5 +116,503 @@ class TestETRSolver(unittest.TestCase):
             self.assertFalse(etr.verify())
             etr.solve(i, 20)
             self.assertTrue(etr.verify())
+        etr.last_model = Model()
+        etr.last_model.update_value(Real("path_x"), RealVal("1" * 5000 + "/3"))
+        witnesses = list(etr.witnesses)
+        etr.add_witness()
+        self.assertEqual(list(etr.witnesses), witnesses)
+
+    def test_linear_encoding(self):
+        data = {"path": [[0, 0.5, 0, 2]],
+                "cycles": {"c1": [[0, 1, 1, 1], [1, 1, 0, 0]]}}
+        etr = ETRSolver(data)
+        self.assertTrue(etr.is_linear())
+        etr.encode()
+        goal = Goal()
+        goal.add(etr.solver.assertions())
+        self.assertEqual(Probe("is-lra")(goal), 1)
+        self.assertFalse(ETRSolver({"path": [[0, "X", 10, 1]]}).is_linear())
+
+    def test_dense_backend(self):
+        data = {"path": [[0, 1, 0, 1], [1, 0.5, -1, 2]],
+                "cycles": {
+                    "c1": [
+                        [0, 1, 1, 3],
+                        [3, 1, 0, 0]],
+                    "c2": [
+                        [2, 0, 1, 2]]}}
+        etr = ETRSolver(data, backend="dense")
+        self.assertIsNotNone(etr.backend)
+        for x, y in [(1.5, -1), (0, 0), (3, 0), (2, 5), (5, 2), (1, 1), (1.5, 0), (-1, 0)]:
+            self.assertEqual(etr.verify(x, y), ETRSolver(data).verify(x, y))
+        model = etr.model(5, 2)
+        self.assertEqual(model.eval(Real("path_x") + Real("cycle_x_c1") + Real("cycle_x_c2")), 5)
+        self.assertEqual(list(etr.verify_many([(5, 2), (-1, 0)])), [True, False])
+        self.assertIsNone(ETRSolver({"path": [[0, "X", 10, 1]]}, backend="dense").backend)
+
+    def test_limits(self):
+        with open('example.json', 'r') as f:
+            data = json.load(f)
+        etr = ETRSolver(data, rlimit=1)
+        self.assertIs(etr.verify(3, -1), Result.UNKNOWN)
+        self.assertFalse(etr.verify())
+        self.assertIn("resource", etr.reason_unknown)
+        self.assertIs(ETRSolver(data, timeout=10000).verify(3, -1), Result.SAT)
+        token = CancellationToken()
+        token.cancel()
+        etr = ETRSolver(data, token=token)
+        self.assertIs(etr.verify(3, -1), Result.UNKNOWN)
+        self.assertEqual(etr.reason_unknown, "canceled")
+        self.assertFalse(token.register(etr.solver.ctx))
+        self.assertIsNot(ETRSolver(data, token=CancellationToken()).solver.ctx, main_ctx())
+        etr = ETRSolver(data, token=LateToken())
+        self.assertIs(etr.verify(3, -1), Result.UNKNOWN)
+        self.assertEqual(etr.reason_unknown, "canceled")
+        token = CancellationToken()
+        self.assertIs(ETRSolver(data, token=token).verify(3, -1), Result.SAT)
+        for item in [{"cycles": {"c1": [[0, "X", 1, 1], [1, -1, 2, 0]]}}, {"path": [[0, "X", 10, 1], [1, "-X", 2, 2]]}]:
+            self.assertEqual(ETRSolver(item, token=token).verify(0, 20), ETRSolver(item).verify(0, 20))
+
+    def test_prefilter(self):
+        data = {"path": [[0, 1, 0, 1]],
+                "cycles": {
+                    "c1": [
+                        [1, 1, 1, 1]]}}
+        metrics = Metrics()
+        etr = ETRSolver(data, metrics=metrics)
+        targets = [(3, 1), (-1, 0), (2, 1), (0.5, 0)]
+        self.assertEqual(list(etr.prefilter.classify(targets)),
+                         [Prefilter.CONE, Prefilter.BOX, Prefilter.PASSED, Prefilter.PASSED])
+        self.assertEqual(list(etr.verify_many(targets)), [False, False, True, True])
+        self.assertEqual(metrics.counts["prefilter_cone"], 1)
+        self.assertEqual(metrics.counts["prefilter_box"], 1)
+        self.assertEqual(metrics.calls["check"], 2)
+        for x, y in targets:
+            self.assertEqual(ETRSolver(data).verify(x, y), ETRSolver(data, prefilter=False).verify(x, y))
+        self.assertIsNone(ETRSolver({"path": [[0, "X", 10, 1]]}).prefilter)
+        self.assertIs(ETRSolver(data).verify("1/2", "0"), Result.SAT)
+        self.assertIs(ETRSolver(data).verify(Fraction(-1, 3), 0), Result.UNSAT)
+        self.assertEqual(list(etr.prefilter.classify([("1/2", "abc")])), [Prefilter.PASSED])
+
+    def test_sweep(self):
+        with open('vass.json', 'r') as f:
+            lps = VASS(json.load(f)).linear_path_scheme()[1]
+        etr = ETRSolver(lps)
+        self.assertEqual(etr.get_parameters(), ["X", "Y"])
+        grid = {"X": [-1, 0, 2], "Y": [-3, 1]}
+        results = etr.sweep(-10, 42, grid)
+        self.assertEqual(len(results[Result.SAT]) + len(results[Result.UNSAT]), 6)
+        for x, y in results[Result.SAT] + results[Result.UNSAT]:
+            data = json.loads(json.dumps(lps.to_json()).replace('"X"', str(x)).replace('"Y"', str(y)))
+            self.assertEqual((x, y) in results[Result.SAT], bool(ETRSolver(data).verify(-10, 42)))
+        self.assertRaises(ValueError, etr.sweep, 0, 0, {"Z": [1]})
+
+    def test_reachable_region(self):
+        data = {"path": [[0, 1, 0, 1], [1, 0.5, -1, 2]],
+                "cycles": {
+                    "c1": [
+                        [0, 1, 1, 3],
+                        [3, -1, 0, 0]],
+                    "c2": [
+                        [2, 0, 1, 2]]}}
+        etr = ETRSolver(data, incremental=True)
+        region = etr.reachable_region()
+        targets = [(x / 2, y / 2) for x in range(-4, 7) for y in range(-6, 7)]
+        expected = [bool(etr.verify(x, y)) for x, y in targets]
+        self.assertEqual(list(region.contains_many(targets)), expected)
+        self.assertTrue(region.contains(1.5, -1))
+        self.assertFalse(region.contains(1.5, -2))
+        self.assertTrue(region.contains("3/2", Fraction(-1)))
+        self.assertRaises(ValueError, region.contains, "X", 0)
+        solver = Solver()
+        solver.add(region.formula(), Real("target_x") == 1.5, Real("target_y") == -2)
+        self.assertEqual(solver.check(), unsat)
+        self.assertRaises(ValueError, ETRSolver({"path": [[0, "X", 10, 1]]}).reachable_region)
+
+    def test_incremental(self):
+        data = {"path": [[0, 0, 0, 2]],
+                "cycles": {
+                    "c1": [
+                        [0, 1, 1, 1],
+                        [1, 1, 0, 0]],
+                    "c2": [
+                        [2, 0, 1, 3],
+                        [3, 2, 2, 2]]}}
+        etr = ETRSolver(data)
+        inc = ETRSolver(data, incremental=True)
+        for x, y in [(2, 1), (2, 2), (10, 0), (0, 0), (3, 1)]:
+            self.assertEqual(etr.verify(x, y), inc.verify(x, y))
+        inc.solve(2, 1)
+        self.assertTrue(inc.verify())
+        self.assertIs(inc.model(), inc.model(2, 1))
+
+    def test_verify_many(self):
+        data = {"path": [[0, 0, 0, 2]],
+                "cycles": {
+                    "c1": [
+                        [0, 1, 1, 1],
+                        [1, 1, 0, 0]],
+                    "c2": [
+                        [2, 0, 1, 3],
+                        [3, 2, 2, 2]]}}
+        etr = ETRSolver(data)
+        xs = range(-1, 4)
+        ys = [-1, 0, 0.5, 1, 2]
+        grid = etr.verify_grid(xs, ys)
+        self.assertEqual(grid.shape, (5, 5))
+        for i, x in enumerate(xs):
+            for j, y in enumerate(ys):
+                self.assertEqual(grid[i, j], bool(ETRSolver(data).verify(x, y)))
+        self.assertEqual(list(etr.verify_many([(2, 1), (10, 0)])), [True, False])
+
+    def test_cache(self):
+        data = {"path": [[0, 0, 0, 2]],
+                "cycles": {"c1": [[0, 1, 1, 1], [1, 1, 0, 0]]}}
+        renamed = {"path": [["a", 0, 0, "b"]],
+                   "cycles": {"loop": [["a", 1, 1, "c"], ["c", 1, 0, "a"]]}}
+        cache = ResultCache(max_entries=2)
+        self.assertTrue(ETRSolver(data, cache=cache).verify(2, 1))
+        self.assertFalse(ETRSolver(data, cache=cache).verify(2, 2))
+        self.assertEqual((cache.hits, cache.misses), (0, 2))
+        etr = ETRSolver(renamed, cache=cache)
+        self.assertTrue(etr.verify(2, 1))
+        self.assertEqual(etr.model().eval(Real("a_a--c") + Real("a_c--a")), etr.model().eval(Real("cycle_x_loop")))
+        self.assertFalse(etr.verify(2, 2))
+        self.assertEqual((cache.hits, cache.misses), (2, 2))
+        ETRSolver(data, cache=cache).verify(3, 1)
+        self.assertEqual(len(cache), 2)
+        self.assertNotIn(cache.key(data["path"], data["cycles"], 2, 1), cache)
+
+
+class TestVASS(unittest.TestCase):
+    def test_paths_and_cycles(self):
+        data = {"start": 0, "end": 4,
+                "edges": [
+                    {"p": 0, "x": 5, "y": 7, "q": 1},
+                    {"p": 1, "x": "X", "y": 6, "q": 1},
+                    {"p": 1, "x": 3, "y": -4, "q": 2},
+                    {"p": 2, "x": 0, "y": "X", "q": 3},
+                    {"p": 3, "x": "Y", "y": -5, "q": 2},
+                    {"p": 2, "x": 0.5, "y": 5, "q": 1},
+                    {"p": 1, "x": 0, "y": 20, "q": 4}]}
+        paths, cycles = VASS(data).find_paths_and_cycles()
+        self.assertEqual(paths, [["0", "1", "4"]])
+        self.assertEqual(cycles, [["1", "1"], ["1", "2", "1"], ["2", "3", "2"]])
+
+    def test_strongly_connected_components(self):
+        data = {"start": 0, "end": 3,
+                "edges": [
+                    {"p": 0, "x": 1, "y": 0, "q": 1},
+                    {"p": 1, "x": 0, "y": 1, "q": 0},
+                    {"p": 1, "x": 1, "y": 1, "q": 2},
+                    {"p": 2, "x": 1, "y": 1, "q": 3},
+                    {"p": 1, "x": 0, "y": 0, "q": 4},
+                    {"p": 4, "x": 2, "y": 0, "q": 5},
+                    {"p": 5, "x": 0, "y": 2, "q": 4}]}
+        vass = VASS(data)
+        components, component_of = vass.strongly_connected_components()
+        self.assertEqual(components[0], ["0", "1"])
+        self.assertEqual(component_of["4"], component_of["5"])
+        self.assertEqual(vass.relevant_states(), {"0", "1", "2", "3"})
+        paths, cycles = vass.find_paths_and_cycles()
+        self.assertEqual(paths, [["0", "1", "2", "3"]])
+        self.assertEqual(cycles, [["0", "1", "0"]])
+
+    def test_bounded_tree(self):
+        length = 5000
+        data = {"start": 0, "end": length,
+                "edges": [{"p": i, "x": 1, "y": 0, "q": i + 1} for i in range(length)] +
+                         [{"p": length, "x": 0, "y": 1, "q": 0}]}
+        vass = VASS(data)
+        tree = vass.construct_reachability_tree()
+        self.assertEqual(sum(1 for _ in tree.preorder()), length + 2)
+        self.assertFalse(vass.truncated)
+        paths, cycles = vass.find_paths_and_cycles()
+        self.assertEqual((len(paths), len(cycles)), (1, 1))
+        tree = vass.construct_reachability_tree(max_depth=10)
+        self.assertEqual(sum(1 for _ in tree.preorder()), 11)
+        self.assertTrue(vass.truncated)
+        tree = vass.construct_reachability_tree(max_nodes=100, lazy=True)
+        self.assertFalse(tree.is_expanded())
+        self.assertEqual(tree.children[0].node, "1")
+        self.assertEqual(sum(1 for _ in tree.preorder()), 100)
+        self.assertEqual(vass.find_paths_and_cycles(max_nodes=100), ([], []))
+        self.assertTrue(vass.truncated)
+
+    def test_duplicate_edges(self):
+        data = {"start": 0, "end": 1,
+                "edges": [
+                    {"p": 0, "x": 1, "y": 0, "q": 1},
+                    {"p": 0, "x": 2, "y": 0, "q": 1},
+                    {"p": 0, "x": 3, "y": 0, "q": 1}]}
+        vass = VASS(data)
+        self.assertEqual(vass.get_transition("0", "1"), (1, 0))
+        self.assertEqual(vass.get_transition("0", "0-1"), (0, 0))
+        self.assertEqual(vass.get_transition("0-1", "1"), (3, 0))
+        self.assertEqual(vass.adjacency_list()["0"], ["0-0", "0-1", "1"])
+        self.assertRaises(IndexError, vass.get_transition, "1", "0")
+
+    def test_canonical_cycle(self):
+        vass = VASS({"edges": []})
+        self.assertEqual(vass.canonical_cycle(["2", "3", "1", "2"]), ("1", "2", "3"))
+        self.assertEqual(vass.canonical_cycle(["1", "2", "3", "1"]), ("1", "2", "3"))
+        self.assertNotEqual(vass.canonical_cycle(["1", "3", "2", "1"]), ("1", "2", "3"))
+        self.assertTrue(vass.cycle_exists({("1", "2", "3")}, ["3", "1", "2", "3"]))
+
+    def test_iter_linear_path_schemes(self):
+        with open('vass.json', 'r') as f:
+            data = json.load(f)
+        lpss = VASS(data).iter_linear_path_schemes()
+        lps = next(lpss)
+        self.assertEqual(lps.to_json()["path"], [["0_0", 5, 7, "1_0"], ["1_0", 0, 0, "1_1"], ["1_1", 0, 20, "4_0"]])
+        self.assertEqual(lps.path[0], Transition(0, 5, 7, 1))
+        self.assertEqual(lps.labels[:3], [(0, 0), (1, 0), (1, 1)])
+        self.assertEqual(len(list(lpss)), 1)
+        self.assertEqual(set(lps.states), {state for state, _ in lps.labels})
+        self.assertEqual(pickle.loads(pickle.dumps(lps)), lps)
+        self.assertEqual(hash(lps.path[0]), hash(Transition(0, 5, 7, 1)))
+        self.assertRaises(TypeError, hash, lps)
+
+    def test_prune_linear_path_schemes(self):
+        # The paths 0 2 1 4 and 0 2 3 4 both reach the self loops in 1 and 3 by flattening the other cycle through
+        # 2 and 4, which gives the same path 0 2 3 4 2 1 4 twice. The second time, it has no cycles that the first
+        # does not have.
+        edges = [(0, 1), (0, 2), (1, 1), (1, 2), (1, 4), (2, 1), (2, 3), (3, 3), (3, 4), (4, 2)]
+        data = {"start": 0, "end": 4, "edges": [{"p": p, "x": p, "y": q, "q": q} for p, q in edges]}
+        metrics = Metrics()
+        vass = VASS(data, metrics=metrics)
+        lpss = list(vass.iter_linear_path_schemes(prune=False))
+        pruned = list(vass.iter_linear_path_schemes())
+        self.assertEqual(metrics.counts["pruned_lps"], 1)
+        self.assertEqual(pruned, [lps for lps in lpss if lps in pruned])
+        dominated = [lps for lps in lpss if lps not in pruned]
+        self.assertEqual(len(dominated), 1)
+
+        def states(lps):
+            labels = [lps.labels[item.p] for item in lps.path] + [lps.labels[lps.path[-1].q]]
+            return [lps.states[state] for i, (state, _) in enumerate(labels) if i == 0 or labels[i - 1][0] != state]
+
+        self.assertEqual(states(dominated[0]), ["0", "2", "3", "4", "2", "1", "4"])
+        self.assertTrue(any(states(lps) == states(dominated[0]) and len(lps.cycles) >= len(dominated[0].cycles)
+                            for lps in lpss[:lpss.index(dominated[0])]))
+
+    def test_is_reachable(self):
+        data = {"start": 0, "end": 2, "start_x": 0, "start_y": 1, "end_x": 1, "end_y": 5,
+                "edges": [
+                    {"p": 0, "x": 1, "y": 0, "q": 1},
+                    {"p": 1, "x": 0, "y": 1, "q": 1},
+                    {"p": 1, "x": 0, "y": 0, "q": 2}]}
+        self.assertTrue(VASS(data).is_reachable(workers=1))
+        self.assertTrue(VASS(data).is_reachable(workers=2))
+        data["end_y"] = 0
+        self.assertIs(VASS(data).is_reachable(workers=1), Result.UNSAT)
+        self.assertIs(VASS(data).is_reachable(workers=2), Result.UNSAT)
+
+    def test_is_reachable_limits(self):
+        data = {"start": 0, "end": 1,
+                "edges": [
+                    {"p": 0, "x": "X", "y": "Y", "q": 1},
+                    {"p": 1, "x": "Y", "y": "X", "q": 1}]}
+        vass = VASS(data)
+        self.assertIs(vass.is_reachable(workers=1, rlimit=1), Result.UNKNOWN)
+        self.assertEqual(len(vass.unknown_lps), 1)
+        self.assertIs(vass.is_reachable(workers=2, rlimit=1), Result.UNKNOWN)
+        self.assertEqual(len(vass.unknown_lps), 1)
+        self.assertIs(vass.is_reachable(workers=1, budget=0), Result.UNKNOWN)
+        token = CancellationToken()
+        token.cancel()
+        self.assertIs(vass.is_reachable(workers=2, token=token), Result.UNKNOWN)
+
+    def test_is_reachable_stops_workers(self):
+        data = {"start": 0, "end": 1, "end_x": -3, "end_y": 0,
+                "edges": [
+                    {"p": 0, "x": 0, "y": 0, "q": 1},
+                    {"p": 0, "x": 1, "y": 2, "q": 1},
+                    {"p": 1, "x": 0, "y": 2, "q": 0},
+                    {"p": 1, "x": -2, "y": 0, "q": 1}]}
+        start = time.monotonic()
+        with unittest.mock.patch("VASS.lps_reachable", slow_unless_reachable):
+            self.assertIs(VASS(data).is_reachable(workers=2), Result.SAT)
+        self.assertLess(time.monotonic() - start, 30)
+        self.assertEqual(multiprocessing.active_children(), [])
+
+    def test_is_reachable_in_flight(self):
+        edges = [{"p": 0, "x": 1, "y": 0, "q": state} for state in range(2, 12)]
+        edges += [{"p": state, "x": 0, "y": 0, "q": 1} for state in range(2, 12)]
+        vass = VASS({"start": 0, "end": 1, "end_x": 5, "end_y": 5, "edges": edges})
+        in_flight = list()
+
+        def record(futures, **kwargs):
+            in_flight.append(len(futures))
+            return concurrent.futures.wait(futures, **kwargs)
+
+        with unittest.mock.patch("VASS.wait", record):
+            self.assertIs(vass.is_reachable(workers=2), Result.UNSAT)
+        self.assertGreaterEqual(len(in_flight), 3)
+        self.assertLessEqual(max(in_flight), 4)
+
+    def test_metrics(self):
+        with open('vass.json', 'r') as f:
+            data = json.load(f)
+        events = list()
+        metrics = Metrics(callback=lambda kind, name, value: events.append((kind, name)))
+        vass = VASS(data, metrics=metrics)
+        vass.construct_reachability_tree()
+        lpss = vass.linear_path_scheme()
+        self.assertEqual(metrics.counts["paths"], 1)
+        self.assertEqual(metrics.counts["lps"], len(lpss))
+        self.assertGreater(metrics.counts["tree_nodes"], 1)
+        self.assertEqual(metrics.calls["export"], len(lpss))
+        ETRSolver(lpss[0], metrics=metrics).verify(0, 0)
+        self.assertEqual(metrics.calls["check"], 1)
+        self.assertIn("max memory", metrics.statistics)
+        self.assertIn(("time", "enumeration"), events)
+        self.assertEqual(set(metrics.as_dict()), {"timings", "calls", "counts", "statistics"})
+
+    def test_statistics(self):
+        data = {"cycles": {"c1": [[0, 1, 1, 1], [1, 1, 0, 0]]}}
+        metrics = Metrics()
+        etr = ETRSolver(data, incremental=True, metrics=metrics, prefilter=False)
+        for target in range(4):
+            etr.verify(target + 10, 0)
+        self.assertEqual(metrics.calls["check"], 4)
+        self.assertEqual(metrics.statistics["num checks"], 4)
+
+
+class TestVASSLoader(unittest.TestCase):
+    def test_load(self):
+        with open('vass.json', 'r') as f:
+            data = json.load(f)
+        data["edges"].append(dict(data["edges"][0], x=0.5))
+        text = json.dumps({"edges": data["edges"], "start": data["start"], "end": data["end"]}, indent=1)
+        vass = VASSLoader(chunk_size=7).load(io.StringIO(text))
+        expected = VASS(data)
+        self.assertEqual((vass.start, vass.end), (expected.start, expected.end))
+        self.assertEqual(vass.updates, expected.updates)
+        self.assertEqual(vass.linear_path_scheme(), expected.linear_path_scheme())
+        self.assertRaises(ValueError, VASSLoader().load, io.StringIO('{"edges": [{"p": 0, "x": 1, "y": 2, "q": 1}'))
+
+    def test_chunk_boundaries(self):
+        data = {"start": 0, "end": 1, "start_x": 12.5, "start_y": -0.125, "end_x": 1.5e3, "end_y": -2.25E-2,
+                "edges": [{"p": 0, "x": 10.75, "y": -3, "q": 1}]}
+        text = json.dumps(data)
+        expected = VASS(data)
+        for chunk_size in range(1, len(text) + 1):
+            vass = VASSLoader(chunk_size=chunk_size).load(io.StringIO(text))
+            self.assertEqual((vass.init_x, vass.init_y, vass.target_x, vass.target_y),
+                             (expected.init_x, expected.init_y, expected.target_x, expected.target_y))
+            self.assertEqual(vass.updates, expected.updates)
+
+    def test_snapshot(self):
+        with open('vass.json', 'r') as f:
+            vass = VASSLoader().load(f)
+        vass.add_edge("4", 2 ** 60 + 1, 0.1, "10")
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "vass.bin")
+            save_snapshot(vass, path)
+            loaded = load_snapshot(path)
+            self.assertEqual(loaded.states, vass.states)
+            self.assertEqual(loaded.updates, vass.updates)
+            self.assertEqual(list(loaded.edges), vass.edges)
+            self.assertEqual(loaded.get_transition("4", "10"), (2 ** 60 + 1, 0.1))
+            self.assertEqual(loaded.linear_path_scheme(), vass.linear_path_scheme())
+            loaded.add_edge("10", 1, 1, "4")
+            self.assertEqual(loaded.get_transition("10", "4"), (1, 1))
+            self.assertEqual(loaded.edges[-1], Transition(loaded.state_ids["10"], 1, 1, loaded.state_ids["4"]))
+            # Close the memory map before the directory is removed
+            del loaded
+            with open(path, "r+b") as f:
+                f.write(b"JSON")
+            self.assertRaises(ValueError, load_snapshot, path)
+
+
+class TestMultiSchemeSolver(unittest.TestCase):
+    def test_shared_prefixes(self):
+        data = {"start": 0, "end": 1,
+                "edges": [
+                    {"p": 0, "x": 0, "y": 0, "q": 1},
+                    {"p": 0, "x": 1, "y": 2, "q": 1},
+                    {"p": 1, "x": 0, "y": 2, "q": 0},
+                    {"p": 1, "x": -2, "y": 0, "q": 1}]}
+        with open('vass.json', 'r') as f:
+            parameters = json.load(f)
+        for lpss in [VASS(data).linear_path_scheme(), VASS(parameters).linear_path_scheme()]:
+            metrics = Metrics()
+            solver = MultiSchemeSolver(lpss, metrics=metrics)
+            transitions = sum(len(lps.path) + len(lps.cycles) for lps in lpss)
+            self.assertLess(metrics.counts["trie_nodes"], transitions + 1)
+            for x, y in [(-3, 0), (-10, 42), (0, 0), (1, 2)]:
+                expected = [ETRSolver(lps).verify(x, y) for lps in lpss]
+                self.assertEqual(solver.verify_all(x, y), expected)
+                self.assertEqual(bool(solver.verify(x, y)), any(expected))
+            self.assertEqual(solver.solver.num_scopes(), 0)
+        solver = MultiSchemeSolver(VASS(data).linear_path_scheme())
+        self.assertEqual(solver.verify_all(-3, 0), [Result.UNSAT, Result.SAT])
+
+
+class TestReachabilityServer(unittest.TestCase):
+    def test_queries(self):
+        data = {"start": 0, "end": 2,
+                "edges": [
+                    {"p": 0, "x": 1, "y": 0, "q": 1},
+                    {"p": 1, "x": 0, "y": 1, "q": 1},
+                    {"p": 1, "x": 0, "y": 0, "q": 2}]}
+
+        async def query():
+            server = ReachabilityServer(workers=2, max_pending=1)
+            await server.start()
+            try:
+                reader, writer = await asyncio.open_connection(*server.address)
+                for i in range(3):
+                    writer.write((json.dumps({"id": i, "vass": data, "targets": [[1, 4], [0, 0]]}) + "\n").encode())
+                writer.write(b"{}\n")
+                writer.write_eof()
+                responses = [json.loads(line) async for line in reader]
+                return responses, server.cache_misses
+            finally:
+                await server.close()
+
+        responses, misses = asyncio.run(query())
+        self.assertEqual(len(responses), 4)
+        self.assertEqual(misses, 1)
+        results = {response["id"]: response for response in responses}
+        self.assertIn("error", results[None])
+        for i in range(3):
+            self.assertEqual(results[i]["results"], ["sat", "unsat"])
+        self.assertEqual(sum(results[i]["cached"] for i in range(3)), 2)
+
+    def test_long_lines(self):
+        data = {"start": 0, "end": 1, "edges": [{"p": 0, "x": 1, "y": 0, "q": 1}]}
+        long_request = {"id": "long", "vass": data, "targets": [[1, 0]] * 10000}
+
+        async def query(limit):
+            server = ReachabilityServer(workers=1, limit=limit)
+            await server.start()
+            try:
+                reader, writer = await asyncio.open_connection(*server.address, limit=1 << 20)
+                writer.write((json.dumps(long_request) + "\n").encode())
+                writer.write((json.dumps({"id": "short", "vass": data, "targets": [[1, 0]]}) + "\n").encode())
+                writer.write_eof()
+                return {response["id"]: response for response in [json.loads(line) async for line in reader]}
+            finally:
+                await server.close()
+
+        self.assertGreater(len(json.dumps(long_request)), 1 << 16)
+        results = asyncio.run(query(1 << 20))
+        self.assertEqual(results["long"]["results"], ["sat"] * 10000)
+        self.assertEqual(results["short"]["results"], ["sat"])
+        results = asyncio.run(query(1 << 10))
+        self.assertEqual(set(results), {None, "short"})
+        self.assertIn("longer than the limit", results[None]["error"])
+        self.assertEqual(results["short"]["results"], ["sat"])
 
 
+class TestBenchmark(unittest.TestCase):
+    def test_random_vass(self):
+        data = benchmark.random_vass(6, density=0.5, cycles=3, parameters=2, seed=1)
+        self.assertEqual(data, benchmark.random_vass(6, density=0.5, cycles=3, parameters=2, seed=1))
+        updates = [edge[key] for edge in data["edges"] for key in ["x", "y"]]
+        self.assertEqual({value for value in updates if isinstance(value, str)}, {"P0", "P1"})
+        result = benchmark.benchmark(data)
+        self.assertEqual(set(result["phases"]), set(benchmark.PHASES))
+        self.assertGreaterEqual(result["paths"], 1)